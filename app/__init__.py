@@ -0,0 +1,4 @@
+import time
+
+# Reference point for the startup budget report logged by app.main
+IMPORT_STARTED_AT = time.perf_counter()
@@ -1,16 +1,8 @@
 from fastapi import HTTPException, status
 
+from app.core.database import (get_async_db, get_async_read_db,  # noqa: F401
+                               get_db)
 from app.core.service_container import services
-from app.db.session import SessionLocal
-
-
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 
 # Service dependencies with initialization check
@@ -40,6 +32,10 @@ def get_websocket_manager():
     return ensure_services_initialized().websocket_manager
 
 
+def get_generation_registry():
+    return ensure_services_initialized().generation_registry
+
+
 def get_pdf_service():
     pdf_service = ensure_services_initialized().pdf_service
     if pdf_service is None:
@@ -4,10 +4,11 @@ from fastapi import (APIRouter, Depends, HTTPException, Request, Response,
                      status)
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core import security
-from app.core.database import get_db
+from app.core.database import get_async_db, get_async_read_db
+from app.crud.user import get_user_by_email
 from app.core.logging_config import get_logger
 from app.models.domain.user import User as UserModel
 from app.schemas.user import Token, UserCreate, UserResponse
@@ -51,14 +52,13 @@ async def get_ws_token(current_user: UserModel = Depends(security.get_current_us
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     try:
         logger.debug(f"Login attempt for user: {form_data.username}")
 
         # Find user
-        user = db.query(UserModel).filter(
-            UserModel.email == form_data.username).first()
+        user = await get_user_by_email(db, email=form_data.username)
         if not user:
             logger.warning(f"User not found: {form_data.username}")
             raise HTTPException(
@@ -111,16 +111,13 @@ async def login(
 async def signup(
     response: Response,
     user_data: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
         logger.debug(f"Signup attempt for email: {user_data.email}")
 
         # Check existing user
-        existing_user = (
-            db.query(UserModel).filter(
-                UserModel.email == user_data.email).first()
-        )
+        existing_user = await get_user_by_email(db, email=user_data.email)
         if existing_user:
             logger.warning(f"Email already registered: {user_data.email}")
             raise HTTPException(
@@ -137,8 +134,8 @@ async def signup(
         )
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
 
         logger.info(f"Created new user: {new_user.email} (ID: {new_user.id})")
 
@@ -1,14 +1,18 @@
-from typing import Dict, Literal
+import hashlib
+import json
+from typing import Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_chat_service, get_db
+from app.api.deps import (get_async_db, get_async_read_db, get_chat_service,
+                          get_generation_registry)
+from app.core.generation_registry import GenerationCancelled, GenerationRegistry
 from app.core.logging_config import get_logger
 from app.core.security import get_current_user
-from app.models.domain.message import Message as MessageModel
+from app.db.utils import get_async_db_session, get_async_read_db_session
 from app.models.domain.user import User
-from app.models.domain.vote import Vote as VoteModel
 from app.services.chat_service import ChatService
 
 logger = get_logger(__name__)
@@ -17,44 +21,49 @@ logger = get_logger(__name__)
 router = APIRouter()
 
 
-@router.post("/{file_id}/chat")
-async def chat(
-    file_id: str,
-    request: Request,
-    current_user=Depends(get_current_user),
-    chat_service: ChatService = Depends(get_chat_service),
-    db: Session = Depends(get_db),
-):
-    # Get message from form data
-    form_data = await request.form()
-    message = form_data.get("message")
+def _cancelled(e: GenerationCancelled) -> HTTPException:
+    logger.info(f"Generation cancelled: {e.reason}")
+    return HTTPException(status_code=409, detail=f"Generation cancelled: {e.reason}")
 
-    if not message:
-        raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    # Verify access
-    if not await chat_service.verify_pdf_access(file_id, current_user.id, db):
-        raise HTTPException(
-            status_code=403, detail="Access denied to this PDF")
+def _since(form_data) -> Optional[int]:
+    """Id of the last message the client shows, asking for only newer ones"""
+    since = form_data.get("since")
+    if not since:
+        return None
+    try:
+        return int(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be a message id")
 
-    # Get model response
-    response = await chat_service.get_response(message, file_id, db)
 
-    # Save both messages
-    await chat_service.save_message_pair(
-        user_id=current_user.id,
-        file_id=file_id,
-        user_message=message,
-        assistant_response=response,
-        db=db
-    )
+def _page_etag(messages: List) -> str:
+    """Weak ETag of a rendered page: its messages and their vote counts"""
+    digest = hashlib.sha1(repr([
+        (message.id, message.upvotes, message.downvotes, message.user_vote)
+        for message in messages
+    ]).encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
 
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def _render_turn(request: Request, file_id: str, turn: Dict):
+    cached = bool(turn["response"].get("cached"))
     return request.app.state.templates.TemplateResponse(
         "components/chat-messages.html",
         {
             "request": request,
-            "messages": await chat_service.get_chat_history(file_id, current_user.id, db)
-        }
+            "file_id": file_id,
+            "messages": turn["messages"],
+            "next_cursor": turn["next_cursor"],
+            # The answer is the last message of the turn
+            "cached_message_id": turn["messages"][-1].id if cached else None,
+        },
+        headers={"X-Answer-Cached": "true" if cached else "false"},
     )
 
 
@@ -62,129 +71,173 @@ async def chat(
 async def get_messages(
     file_id: str,
     request: Request,
+    before: Optional[str] = None,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    chat_service: ChatService = Depends(get_chat_service),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
+    """
+    Newest page of messages, or the page older than the `before` cursor.
+    The newest page carries an ETag; 304 if the client's copy is current.
+    """
     try:
-        # Get messages
-        messages = (
-            db.query(MessageModel)
-            .filter(
-                MessageModel.file_id == file_id,
-                MessageModel.user_id == current_user.id
-            )
-            .order_by(MessageModel.created_at.asc())
-            .all()
-        )
+        messages, next_cursor = await chat_service.get_history_page(
+            file_id, current_user.id, db, before)
 
-        # Get votes
-        user_votes = {}
-        if messages:
-            message_ids = [message.id for message in messages]
-            votes = (
-                db.query(VoteModel)
-                .filter(
-                    VoteModel.user_id == current_user.id,
-                    VoteModel.message_id.in_(message_ids)
-                )
-                .all()
-            )
-            user_votes = {vote.message_id: vote.vote_type for vote in votes}
+        # Browsers revalidate instead of reusing a cached page unasked
+        headers = {"Cache-Control": "private, no-cache"}
+        if not before:
+            headers["ETag"] = _page_etag(messages)
+            if _not_modified(request, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
 
         return request.app.state.templates.TemplateResponse(
             "components/chat-messages.html",
             {
                 "request": request,
+                "file_id": file_id,
                 "messages": messages,
-                "user_votes": user_votes
-            }
+                "next_cursor": next_cursor
+            },
+            headers=headers,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting messages: {str(e)}")
         return request.app.state.templates.TemplateResponse(
             "components/chat-messages.html",
             {
                 "request": request,
-                "messages": [],
-                "user_votes": {}
+                "messages": []
             }
         )
 
 
+@router.post("/{file_id}/chat")
 @router.post("/{file_id}/send")
 async def send_message(
     file_id: str,
     request: Request,
     current_user: User = Depends(get_current_user),
     chat_service: ChatService = Depends(get_chat_service),
-    db: Session = Depends(get_db),
+    generation_registry: GenerationRegistry = Depends(get_generation_registry),
 ):
-    """Send a message and get response"""
+    """
+    Send a message and get response. With a `since` form field only the
+    messages after that id are rendered, otherwise the whole conversation.
+    """
     form_data = await request.form()
     message_text = form_data.get("message")
 
     if not message_text:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    # Save user message
-    user_message = MessageModel(
-        user_id=current_user.id,
-        file_id=file_id,
-        role="user",
-        content=message_text
-    )
-    db.add(user_message)
-    db.commit()
-
-    # Get model response
-    response = await chat_service.get_response(
-        query=message_text,
-        file_id=file_id,
-        db=db
-    )
-
-    # Save bot message
-    bot_message = MessageModel(
-        user_id=current_user.id,
-        file_id=file_id,
-        role="assistant",
-        content=response["response"],
-        sources=response.get("sources", "[]")
-    )
-    db.add(bot_message)
-    db.commit()
-
-    # Get all messages for this chat
-    all_messages = (
-        db.query(MessageModel)
-        .filter(
-            MessageModel.file_id == file_id,
-            MessageModel.user_id == current_user.id
+    # Answer, abandoned if the client leaves or asks again, while access is
+    # verified and the history loaded alongside
+    try:
+        turn = await generation_registry.run(
+            current_user.id,
+            chat_service.answer_turn(
+                message_text, file_id, current_user.id, _since(form_data)),
+            request.is_disconnected,
         )
-        .order_by(MessageModel.created_at.asc())
-        .all()
-    )
+    except GenerationCancelled as e:
+        raise _cancelled(e)
+    if turn is None:
+        raise HTTPException(
+            status_code=403, detail="Access denied to this PDF")
 
-    # Get user votes
-    message_ids = [message.id for message in all_messages]
-    user_votes = (
-        db.query(VoteModel)
-        .filter(
-            VoteModel.user_id == current_user.id,
-            VoteModel.message_id.in_(message_ids)
-        )
-        .all()
-    )
-    votes_dict = {vote.message_id: vote.vote_type for vote in user_votes}
+    return _render_turn(request, file_id, turn)
 
-    # Return all messages
-    return request.app.state.templates.TemplateResponse(
-        "components/chat-messages.html",
-        {
-            "request": request,
-            "messages": all_messages,
-            "user_votes": votes_dict
-        }
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/{file_id}/stream")
+async def stream_message(
+    file_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service),
+    generation_registry: GenerationRegistry = Depends(get_generation_registry),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Send a message and stream the response tokens as server-sent events.
+    The final event renders the stored question and answer, and with a
+    `since` form field every other message newer than that id too.
+    """
+    form_data = await request.form()
+    message_text = form_data.get("message")
+
+    if not message_text:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    since = _since(form_data)
+
+    # Verify access
+    if not await chat_service.verify_pdf_access(file_id, current_user.id, db):
+        raise HTTPException(
+            status_code=403, detail="Access denied to this PDF")
+
+    user_id = current_user.id
+    templates = request.app.state.templates
+
+    async def event_stream():
+        try:
+            events = generation_registry.stream(
+                user_id,
+                chat_service.stream_response(message_text, file_id, user_id),
+                request.is_disconnected,
+            )
+            async for event in events:
+                if event["type"] == "token":
+                    yield _sse_event("token", {"content": event["content"]})
+                    continue
+
+                # Persist both messages once the full answer is known. The
+                # request's session is already closed while the body streams.
+                async with get_async_db_session() as session:
+                    user_message, bot_message = await chat_service.save_message_pair(
+                        user_id=user_id,
+                        file_id=file_id,
+                        user_message=message_text,
+                        assistant_response=event,
+                        db=session
+                    )
+                messages = [user_message, bot_message]
+                if since is not None:
+                    # Also what other tabs added since the client last rendered
+                    async with get_async_read_db_session() as session:
+                        messages = await chat_service.get_messages_after(
+                            file_id, user_id, since, session)
+                html = templates.get_template(
+                    "components/chat-messages.html"
+                ).render(
+                    request=request,
+                    messages=messages,
+                    cached_message_id=bot_message.id if event["cached"] else None,
+                )
+
+                yield _sse_event("done", {
+                    "message_id": bot_message.id,
+                    "html": html,
+                    "cached": event["cached"],
+                })
+
+        except GenerationCancelled as e:
+            logger.info(f"Streaming cancelled: {e.reason}")
+            yield _sse_event("cancelled", {"detail": e.reason})
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield _sse_event("error", {"detail": "Error generating response"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -195,90 +248,42 @@ async def vote_message(
     vote_type: Literal["upvote", "downvote"],
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Handle upvote/downvote for a message"""
-    message = db.query(MessageModel).filter(
-        MessageModel.id == message_id,
-        MessageModel.file_id == file_id,
-        MessageModel.role == "assistant"  # Only allow voting on assistant messages
-    ).first()
-
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
-
     try:
-        # Check if user has already voted
-        existing_vote = db.query(VoteModel).filter(
-            VoteModel.user_id == current_user.id,
-            VoteModel.message_id == message_id
-        ).first()
-
-        if existing_vote:
-            if existing_vote.vote_type == vote_type:
-                # Remove vote if clicking the same type again
-                if vote_type == "upvote":
-                    message.upvotes = max(0, message.upvotes - 1)
-                else:
-                    message.downvotes = max(0, message.downvotes - 1)
-                db.delete(existing_vote)
-                db.commit()
-                return {
-                    "success": True,
-                    "upvotes": message.upvotes,
-                    "downvotes": message.downvotes,
-                    "userVote": None  # No active vote
-                }
-            else:
-                # Change vote type
-                if vote_type == "upvote":
-                    message.upvotes += 1
-                    message.downvotes = max(0, message.downvotes - 1)
-                else:
-                    message.downvotes += 1
-                    message.upvotes = max(0, message.upvotes - 1)
-                existing_vote.vote_type = vote_type
-        else:
-            # Create new vote
-            new_vote = VoteModel(
-                user_id=current_user.id,
-                message_id=message_id,
-                vote_type=vote_type
-            )
-            db.add(new_vote)
-            if vote_type == "upvote":
-                message.upvotes += 1
-            else:
-                message.downvotes += 1
-
-        db.commit()
-        return {
-            "success": True,
-            "upvotes": message.upvotes,
-            "downvotes": message.downvotes,
-            "userVote": vote_type
-        }
-
+        result = await chat_service.vote(
+            current_user.id, file_id, message_id, vote_type, db)
     except Exception as e:
-        db.rollback()
         logger.error(f"Error processing vote: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if result is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"success": True, **result}
+
 
 @router.get("/{file_id}/history")
 async def get_chat_history(
     file_id: str,
     request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[str] = None,
     current_user=Depends(get_current_user),
     chat_service: ChatService = Depends(get_chat_service),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> Dict:
     # Verify access
     if not await chat_service.verify_pdf_access(file_id, current_user.id, db):
         raise HTTPException(
             status_code=403, detail="Access denied to this PDF")
 
-    # Get chat history
-    messages = await chat_service.get_chat_history(file_id, current_user.id, db)
+    # Get one page of chat history, older pages via next_cursor
+    try:
+        messages, next_cursor = await chat_service.get_chat_history(
+            file_id, current_user.id, db, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {"messages": messages}
+    return {"messages": messages, "next_cursor": next_cursor}
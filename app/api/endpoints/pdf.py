@@ -8,16 +8,17 @@ from fastapi import (APIRouter, BackgroundTasks, Depends, File, HTTPException,
                      Request, UploadFile, WebSocket, WebSocketDisconnect,
                      status)
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_pdf_service, get_websocket_manager
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_read_db
 from app.core.logging_config import get_logger
 from app.core.security import decode_access_token, get_current_user
 from app.core.websocket_manager import WebSocketManager
+from app.crud.user import get_user_by_email
+from app.db.utils import get_async_read_db_session
 from app.models.domain import User
-from app.models.domain.pdf import PDF as PDFModel
 from app.repositories.pdf_repository import PDFRepository
 from app.schemas.pdf import PDF as PDFSchema
 from app.services.pdf_service import PDFService
@@ -35,7 +36,6 @@ async def websocket_endpoint(
     file_id: str,
     token: str = None,
     websocket_manager=Depends(get_websocket_manager),
-    db: Session = Depends(get_db)
 ):
     try:
         # Validate token
@@ -52,8 +52,9 @@ async def websocket_endpoint(
                 await websocket.close(code=4002, reason="Invalid authentication token")
                 return
 
-            # Get user from database
-            user = db.query(User).filter(User.email == payload["sub"]).first()
+            # Get user from database, not holding a connection while open
+            async with get_async_read_db_session() as db:
+                user = await get_user_by_email(db, email=payload["sub"])
             if not user:
                 logger.warning(f"User not found for email: {payload['sub']}")
                 await websocket.close(code=4003, reason="User not found")
@@ -93,7 +94,6 @@ async def websocket_endpoint(
 async def upload_pdf(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
     pdf_service: PDFService = Depends(get_pdf_service)
 ) -> Dict:
@@ -122,8 +122,7 @@ async def upload_pdf(
             file_path=file_path,
             filename=file.filename,
             content=content,
-            user_id=current_user.id,
-            db=db
+            user_id=current_user.id
         )
 
         logger.info(
@@ -144,7 +143,7 @@ async def upload_pdf(
 async def list_pdfs(
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     try:
         pdf_repository = PDFRepository()
@@ -162,14 +161,11 @@ async def list_pdfs(
 async def view_pdf(
     file_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Stream PDF file for viewing"""
     # Check if PDF exists and user has access
-    pdf = db.query(PDFModel).filter(
-        PDFModel.file_id == file_id,
-        PDFModel.user_id == current_user.id
-    ).first()
+    pdf = await PDFRepository.get_user_pdf(file_id, current_user.id, db)
 
     if not pdf:
         raise HTTPException(
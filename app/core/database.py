@@ -1,16 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-from app.core.config import settings
-
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# One engine configuration for the whole app, see app.db.session
+from app.db.session import (AsyncReadSessionLocal, AsyncSessionLocal,
+                            SessionLocal, engine)
 
 Base = declarative_base()
 
 # Import all models here after Base is defined
-from app.models.domain import PDF, Message, User  # noqa
+# Submodules rather than names, as this also runs while app.models.domain
+# itself is being imported
+from app.models.domain import generation, message, pdf, user, vote  # noqa
 
 
 def get_db():
@@ -21,6 +21,17 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """Session on the read pool, for requests that only query"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
 # Create all tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
@@ -28,3 +39,6 @@ def create_tables():
 
 def drop_tables():
     Base.metadata.drop_all(bind=engine)
+    # Migrations then rebuild the schema from scratch
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS schema_migrations"))
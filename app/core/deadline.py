@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+from app.core.logging_config import get_logger
+
+logger = get_logger("deadline")
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of its end-to-end time budget"""
+
+
+class Deadline:
+    """Absolute point in time by which a request has to be answered"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Time a single stage may take: what is left, at most `cap`"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, cap)
+
+    def check(self, stage: str):
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s expired before {stage}")
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being handled, if it has one"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    Run the block (and tasks it starts) under a deadline of `seconds`. Inside
+    an outer scope that expires sooner, the outer deadline stays in force.
+    """
+    if seconds is None:
+        yield None
+        return
+    deadline = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield _current_deadline.get()
+    finally:
+        _current_deadline.reset(token)
+
+
+def stage_timeout(cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for the next stage, drawn from the current deadline if set"""
+    deadline = current_deadline()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+async def within_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """Await a stage, raising DeadlineExceeded if the deadline runs out first"""
+    deadline = current_deadline()
+    if deadline is None:
+        return await awaitable
+    if deadline.expired:
+        # Never started, close it so it is not left un-awaited
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        elif asyncio.isfuture(awaitable):
+            awaitable.cancel()
+    deadline.check(stage)
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline of {deadline.seconds}s expired during {stage}")
+
+
+def stop_when_out_of_budget(min_attempt_seconds: float):
+    """
+    tenacity stop condition: give up once the deadline leaves less than
+    `min_attempt_seconds` for another attempt after the upcoming backoff
+    """
+
+    def stop(retry_state) -> bool:
+        deadline = current_deadline()
+        if deadline is None:
+            return False
+        return deadline.remaining() - retry_state.upcoming_sleep < min_attempt_seconds
+
+    return stop
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[T]],
+    hedge: Optional[Callable[[], Awaitable[T]]],
+    delay: float,
+) -> T:
+    """
+    Start `primary`; if it has not finished after `delay` seconds start
+    `hedge` as well and return whichever succeeds first. The other one is
+    cancelled and waited for, so its request is torn down before returning.
+    """
+    primary_task = asyncio.ensure_future(primary())
+    if hedge is None:
+        return await primary_task
+
+    tasks = {primary_task}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logger.info(f"No answer after {delay:.2f}s, sending hedged request")
+            tasks.add(asyncio.ensure_future(hedge()))
+
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not tasks:
+                # Both failed, surface the error of the last one to finish
+                return done.pop().result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
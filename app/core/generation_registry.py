@@ -0,0 +1,187 @@
+import asyncio
+import uuid
+from typing import (Any, AsyncGenerator, AsyncIterator, Awaitable, Callable,
+                    Coroutine, Dict, Optional)
+
+from app.core.logging_config import get_logger
+from app.db.utils import get_async_db_session, get_async_read_db_session
+from app.repositories.generation_repository import GenerationRepository
+
+logger = get_logger("generation_registry")
+
+DisconnectCheck = Callable[[], Awaitable[bool]]
+
+_END = object()
+_IDLE = object()
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation is abandoned before it finished"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class GenerationRegistry:
+    """
+    Tracks the in-flight LLM generation of each user. A generation is run in
+    its own task so it can be cancelled (closing the httpx request to Ollama)
+    when the client disconnects or when the same user asks a new question.
+
+    Tasks live in one process: by itself the registry only supersedes a
+    generation started by the same worker. With `shared` the newest
+    generation of each user is also recorded in the database, and every
+    in-flight generation checks it at each disconnect poll, so a question
+    sent to another worker (uvicorn --workers) cancels it as well.
+    """
+
+    def __init__(self, disconnect_poll_interval: float = 0.5, shared: bool = False):
+        self.disconnect_poll_interval = disconnect_poll_interval
+        self.shared = shared
+        self._active: Dict[int, asyncio.Task] = {}
+        self._repository = GenerationRepository()
+
+    async def _claim(self, user_id: int) -> Optional[str]:
+        """Record a new generation of the user for every worker to see"""
+        if not self.shared:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            async with get_async_db_session() as db:
+                await self._repository.claim(db, user_id, token)
+        except Exception as e:
+            # Without the record the generation is only superseded locally
+            logger.warning(f"Could not record generation of user {user_id}: {str(e)}")
+            return None
+        return token
+
+    async def _superseded_elsewhere(self, user_id: int, token: Optional[str]) -> bool:
+        if token is None:
+            return False
+        try:
+            async with get_async_read_db_session() as db:
+                return not await self._repository.is_active(db, user_id, token)
+        except Exception as e:
+            logger.warning(f"Could not check generation of user {user_id}: {str(e)}")
+            return False
+
+    async def _release(self, user_id: int, token: Optional[str]):
+        if token is None:
+            return
+        try:
+            async with get_async_db_session() as db:
+                await self._repository.release(db, user_id, token)
+        except Exception as e:
+            logger.warning(f"Could not release generation of user {user_id}: {str(e)}")
+
+    def _start(self, user_id: int, coro: Coroutine) -> asyncio.Task:
+        previous = self._active.get(user_id)
+        if previous is not None and not previous.done():
+            logger.info(
+                f"Cancelling unfinished generation of user {user_id}, "
+                f"superseded by a new query"
+            )
+            previous.cancel()
+        task = asyncio.ensure_future(coro)
+        self._active[user_id] = task
+        return task
+
+    def _finish(self, user_id: int, task: asyncio.Task):
+        if not task.done():
+            task.cancel()
+        if self._active.get(user_id) is task:
+            del self._active[user_id]
+
+    @staticmethod
+    def _raise_outcome(task: asyncio.Task):
+        # Nobody but a newer query of the same user cancels the task itself
+        if task.cancelled():
+            raise GenerationCancelled("superseded by a newer query")
+        task.result()
+
+    async def _cancel_if_abandoned(
+        self,
+        user_id: int,
+        token: Optional[str],
+        task: asyncio.Task,
+        is_disconnected: Optional[DisconnectCheck],
+    ):
+        """Cancel the task and raise GenerationCancelled if the client went away or asked again"""
+        if await self._superseded_elsewhere(user_id, token):
+            logger.info(
+                f"Cancelling generation of user {user_id}, superseded by a "
+                f"newer query in another worker"
+            )
+            reason = "superseded by a newer query"
+        elif is_disconnected is not None and await is_disconnected():
+            logger.info(f"Client of user {user_id} disconnected, cancelling generation")
+            reason = "client disconnected"
+        else:
+            return
+        task.cancel()
+        # Let the cancellation unwind so the Ollama connection is closed now
+        await asyncio.wait({task})
+        raise GenerationCancelled(reason)
+
+    async def run(
+        self,
+        user_id: int,
+        coro: Coroutine[Any, Any, Any],
+        is_disconnected: Optional[DisconnectCheck] = None,
+    ) -> Any:
+        """Run a generation to completion unless it is cancelled"""
+        token = await self._claim(user_id)
+        task = self._start(user_id, coro)
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.disconnect_poll_interval)
+                if not task.done():
+                    await self._cancel_if_abandoned(user_id, token, task, is_disconnected)
+            self._raise_outcome(task)
+            return task.result()
+        finally:
+            self._finish(user_id, task)
+            await self._release(user_id, token)
+
+    async def stream(
+        self,
+        user_id: int,
+        events: AsyncIterator[Any],
+        is_disconnected: Optional[DisconnectCheck] = None,
+    ) -> AsyncGenerator[Any, None]:
+        """Relay a streamed generation, produced in its own cancellable task"""
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_END)
+
+        token = await self._claim(user_id)
+        task = self._start(user_id, produce())
+        loop = asyncio.get_running_loop()
+        next_check = loop.time() + self.disconnect_poll_interval
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=self.disconnect_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    if task.done() and queue.empty():
+                        self._raise_outcome(task)
+                    event = _IDLE
+                # Also checked while tokens keep arriving
+                if loop.time() >= next_check:
+                    await self._cancel_if_abandoned(user_id, token, task, is_disconnected)
+                    next_check = loop.time() + self.disconnect_poll_interval
+                if event is _IDLE:
+                    continue
+                if event is _END:
+                    return
+                yield event
+        finally:
+            # Also reached when the response itself is cancelled on disconnect
+            self._finish(user_id, task)
+            await self._release(user_id, token)
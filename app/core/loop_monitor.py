@@ -0,0 +1,44 @@
+import asyncio
+from typing import Optional
+
+from app.core.logging_config import get_logger
+from app.core.metrics import metrics
+
+logger = get_logger("loop_monitor")
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a timer that should fire every
+    `interval` seconds. The lateness is time the loop spent on blocking work
+    (a synchronous query, CPU-bound code) instead of serving requests.
+    """
+
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.25):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._lag_seconds = metrics.histogram("event_loop_lag_seconds")
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started_at - self.interval, 0.0)
+            self._lag_seconds.observe(lag)
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop blocked for {lag:.3f}s")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, Optional
+
+from app.core.logging_config import get_logger
+
+logger = get_logger("metrics")
+
+# Recent observations kept per histogram for the quantiles in snapshots
+_HISTOGRAM_WINDOW = 1024
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict:
+        return {"type": "counter", "value": self.value}
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def snapshot(self) -> Dict:
+        return {"type": "gauge", "value": self.value}
+
+
+class Histogram:
+    """Count and sum of all observations, quantiles over a recent window"""
+
+    def __init__(self, window: int = _HISTOGRAM_WINDOW):
+        self.count = 0
+        self.sum = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return None
+        return recent[min(int(q * len(recent)), len(recent) - 1)]
+
+    def snapshot(self) -> Dict:
+        return {
+            "type": "histogram",
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """In-process metrics, created on first use and exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, metric_type):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, metric_type())
+        if not isinstance(metric, metric_type):
+            raise ValueError(f"Metric {name} is a {type(metric).__name__}")
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(name, Gauge)
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(name, Histogram)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+
+metrics = MetricsRegistry()
+
+
+class StageTimer:
+    """Wall time of the stages of one request, overlapping stages included"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        metrics.histogram(f"{self.name}_{stage}_seconds").observe(seconds)
+
+    def report(self) -> Dict[str, float]:
+        """Log stage timings in the order the stages finished, with the total"""
+        total = time.perf_counter() - self.started_at
+        metrics.histogram(f"{self.name}_total_seconds").observe(total)
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in self.stages.items())
+        logger.info(f"{self.name} stage timings: {stages}; total {total:.3f}s")
+        return {**self.stages, "total": total}
+
+
+_current_stage_timer: ContextVar[Optional[StageTimer]] = ContextVar(
+    "current_stage_timer", default=None
+)
+
+
+@contextmanager
+def stage_timer(name: str) -> Iterator[StageTimer]:
+    """Collect stage timings of the block, and of tasks it starts"""
+    timer = StageTimer(name)
+    token = _current_stage_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_stage_timer.reset(token)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Record how long the block takes on the current stage timer, if any"""
+    timer = _current_stage_timer.get()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.record(stage, time.perf_counter() - start_time)
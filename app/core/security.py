@@ -3,14 +3,13 @@ from datetime import datetime, timedelta
 from functools import lru_cache
 from typing import Optional
 
-from fastapi import Depends, HTTPException, Request, status
+from fastapi import HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.database import SessionLocal, get_db
+from app.core.database import AsyncReadSessionLocal
 from app.crud.user import get_user_by_email
 from app.models.domain.user import User
 from app.schemas.user import TokenData
@@ -49,20 +48,12 @@ async def get_current_user_or_none(
 ) -> Optional[User]:
     """Get current user if authenticated, otherwise return None"""
     try:
-        # Create a new database session
-        db_session = SessionLocal()
-        try:
-            return await get_current_user(request, db_session)
-        finally:
-            db_session.close()
+        return await get_current_user(request)
     except HTTPException:
         return None
 
 
-async def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db),
-) -> User:
+async def get_current_user(request: Request) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -105,16 +96,13 @@ async def get_current_user(
             logger.error(f"JWT decode error: {str(e)}")
             raise credentials_exception
 
-        # Create a new database session
-        db_session = SessionLocal()
-        try:
-            user = get_user_by_email(db_session, email=email)
-            if user is None:
-                logger.error(f"User not found: {email}")
-                raise credentials_exception
-            return user
-        finally:
-            db_session.close()
+        # A short-lived session, so the connection is not held for the request
+        async with AsyncReadSessionLocal() as db:
+            user = await get_user_by_email(db, email=email)
+        if user is None:
+            logger.error(f"User not found: {email}")
+            raise credentials_exception
+        return user
 
     except Exception as e:
         logger.error(f"Authentication error: {str(e)}")
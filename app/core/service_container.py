@@ -1,11 +1,25 @@
+import asyncio
+import time
+
 from app.core.config import settings
+from app.core.generation_registry import GenerationRegistry
+from app.core.logging_config import get_logger
 from app.core.websocket_manager import WebSocketManager
+from app.services.answer_cache import AnswerCache
 from app.services.chat_service import ChatService
 from app.services.pdf_service import PDFService
 from app.services.rag_pipeline.document_processor import DocumentProcessor
 from app.services.rag_pipeline.embeddings import OllamaEmbeddings
+from app.services.rag_pipeline.keyword_index import KeywordIndex
 from app.services.rag_pipeline.llm import OllamaLLM
+from app.services.rag_pipeline.llm_scheduler import LLMScheduler
+from app.services.rag_pipeline.ollama_pool import OllamaHostPool, parse_urls
+from app.services.rag_pipeline.local_vector_store import LocalVectorStore
+from app.services.rag_pipeline.model_warmer import ModelWarmer
 from app.services.rag_pipeline.vector_store import PineconeStore
+from app.services.retrieval_cache import RetrievalCache
+
+logger = get_logger("service_container")
 
 
 class ServiceContainer:
@@ -25,6 +39,12 @@ class ServiceContainer:
         self.embeddings = None
         self.llm = None
         self.websocket_manager = None
+        self.retrieval_cache = None
+        self.answer_cache = None
+        self.generation_registry = None
+        self.embed_hosts = None
+        self.generate_hosts = None
+        self.model_warmer = None
 
     def is_initialized(self) -> bool:
         """Check if all services are initialized"""
@@ -35,27 +55,88 @@ class ServiceContainer:
             self.chat_service,
             self.embeddings,
             self.llm,
-            self.websocket_manager
+            self.websocket_manager,
+            self.generation_registry
         ])
 
+    async def warm_up(self):
+        """Load heavy resources (Ollama models, NLTK, Pinecone) in the background"""
+        start_time = time.perf_counter()
+        if self.model_warmer:
+            # Keeps running to refresh keep_alive until shutdown
+            self.model_warmer.start()
+        try:
+            await asyncio.to_thread(self.vector_store.warm_up)
+            logger.info(
+                f"Service warm-up finished in {time.perf_counter() - start_time:.2f}s"
+            )
+        except Exception as e:
+            # Resources are loaded lazily on first use anyway, so carry on
+            logger.error(f"Service warm-up failed: {str(e)}")
+
+    async def shutdown(self):
+        if self.model_warmer:
+            await self.model_warmer.stop()
+        if self.vector_store:
+            await asyncio.to_thread(self.vector_store.close)
+
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
             cls._instance = cls()
         return cls._instance
 
+    @staticmethod
+    def _host_pool(urls: str, role: str) -> OllamaHostPool:
+        return OllamaHostPool(
+            parse_urls(urls) or [settings.OLLAMA_BASE_URL],
+            role=role,
+            failure_threshold=settings.OLLAMA_HOST_FAILURE_THRESHOLD,
+            ejection_seconds=settings.OLLAMA_HOST_EJECTION_SECONDS,
+        )
+
     def initialize_services(self):
+        # Separate Ollama pools so bulk embedding never queues behind chat
+        if not self.embed_hosts:
+            self.embed_hosts = self._host_pool(settings.OLLAMA_EMBED_URLS, "embed")
+        if not self.generate_hosts:
+            self.generate_hosts = self._host_pool(
+                settings.OLLAMA_GENERATE_URLS, "generate"
+            )
+
         # Initialize basic services first
         if not self.embeddings:
             self.embeddings = OllamaEmbeddings(
                 base_url=settings.OLLAMA_BASE_URL,
                 model_name=settings.EMBEDDING_MODEL_NAME,
+                hedge_delay=settings.EMBEDDING_HEDGE_DELAY_SECONDS,
+                host_pool=self.embed_hosts,
+                keep_alive=settings.OLLAMA_EMBED_KEEP_ALIVE,
             )
 
         if not self.llm:
             self.llm = OllamaLLM(
                 base_url=settings.OLLAMA_BASE_URL,
-                model_name=settings.LLM_MODEL_NAME
+                model_name=settings.LLM_MODEL_NAME,
+                num_ctx=settings.LLM_NUM_CTX,
+                answer_token_reserve=settings.LLM_ANSWER_TOKEN_RESERVE,
+                context_token_budget=settings.LLM_CONTEXT_TOKEN_BUDGET,
+                chars_per_token=settings.LLM_CHARS_PER_TOKEN,
+                scheduler=LLMScheduler(
+                    max_concurrent=settings.LLM_MAX_CONCURRENT_GENERATIONS,
+                    max_queue_wait=settings.LLM_MAX_QUEUE_WAIT_SECONDS,
+                ),
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+                host_pool=self.generate_hosts,
+            )
+
+        if not self.model_warmer and settings.MODEL_WARMUP_ENABLED:
+            self.model_warmer = ModelWarmer(
+                llm=self.llm,
+                embeddings=self.embeddings,
+                refresh_seconds=settings.MODEL_KEEP_ALIVE_REFRESH_SECONDS,
+                idle_seconds=settings.MODEL_WARM_IDLE_SECONDS,
             )
 
         if not self.document_processor:
@@ -67,15 +148,57 @@ class ServiceContainer:
             )
 
         if not self.vector_store:
-            self.vector_store = PineconeStore(
-                api_key=settings.PINECONE_API_KEY,
-                environment=settings.PINECONE_ENVIRONMENT,
-                index_name=settings.PINECONE_INDEX_NAME,
+            retrieval_options = dict(
+                keyword_index=(
+                    KeywordIndex(settings.KEYWORD_INDEX_PATH)
+                    if settings.HYBRID_SEARCH_ENABLED
+                    else None
+                ),
+                rrf_k=settings.HYBRID_RRF_K,
+                mmr_enabled=settings.MMR_ENABLED,
+                mmr_lambda=settings.MMR_LAMBDA,
+                mmr_candidate_pool=settings.MMR_CANDIDATE_POOL,
+                text_processing_workers=settings.TEXT_PROCESSING_WORKERS,
             )
+            if settings.VECTOR_STORE_BACKEND == "local":
+                self.vector_store = LocalVectorStore(
+                    root_dir=settings.LOCAL_VECTOR_STORE_DIR,
+                    dtype=settings.LOCAL_VECTOR_DTYPE,
+                    rescore_factor=settings.LOCAL_VECTOR_RESCORE_FACTOR,
+                    max_open_documents=settings.LOCAL_VECTOR_MAX_OPEN_DOCUMENTS,
+                    **retrieval_options,
+                )
+            else:
+                self.vector_store = PineconeStore(
+                    api_key=settings.PINECONE_API_KEY,
+                    environment=settings.PINECONE_ENVIRONMENT,
+                    index_name=settings.PINECONE_INDEX_NAME,
+                    **retrieval_options,
+                )
 
         if not self.websocket_manager:
             self.websocket_manager = WebSocketManager()
 
+        if not self.generation_registry:
+            self.generation_registry = GenerationRegistry(
+                disconnect_poll_interval=settings.GENERATION_DISCONNECT_POLL_SECONDS,
+                shared=settings.GENERATION_REGISTRY_SHARED,
+            )
+
+        if not self.retrieval_cache and settings.RETRIEVAL_CACHE_ENABLED:
+            self.retrieval_cache = RetrievalCache(
+                max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+                similarity_threshold=settings.RETRIEVAL_CACHE_SIMILARITY_THRESHOLD,
+            )
+
+        if not self.answer_cache and settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            )
+
         # Initialize PDF service before chat service to break circular dependency
         if not self.pdf_service:
             self.pdf_service = PDFService(
@@ -84,6 +207,8 @@ class ServiceContainer:
                 vector_store=self.vector_store,
                 upload_dir=settings.UPLOAD_DIR,
                 websocket_manager=self.websocket_manager,
+                retrieval_cache=self.retrieval_cache,
+                answer_cache=self.answer_cache,
             )
 
         # Initialize chat service last
@@ -92,6 +217,10 @@ class ServiceContainer:
                 embeddings=self.embeddings,
                 vector_store=self.vector_store,
                 llm=self.llm,
+                retrieval_cache=self.retrieval_cache,
+                answer_cache=self.answer_cache,
+                request_deadline=settings.CHAT_REQUEST_DEADLINE_SECONDS,
+                history_page_size=settings.CHAT_HISTORY_PAGE_SIZE,
             )
 
 
@@ -0,0 +1,139 @@
+"""
+Schema migrations, applied at startup and safe to run from several workers
+at once: PostgreSQL workers take turns through an advisory lock, SQLite
+ones through the database write lock. Run them once before starting the
+workers with
+
+    python -m app.db.migrations
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.database import Base
+from app.core.logging_config import get_logger
+
+logger = get_logger("migrations")
+
+# Key of the PostgreSQL advisory lock held while migrating
+_MIGRATION_LOCK_KEY = 720_440_901
+
+Statement = Union[str, Callable[[Connection], None]]
+
+
+def _create_schema(connection: Connection):
+    # Tables and indexes as the models declare them, skipping existing ones
+    Base.metadata.create_all(bind=connection)
+
+
+# Ordered (id, statements) applied once per database. Databases created by
+# older versions, before migrations existed, already have some of these
+# tables and indexes, so statements must be idempotent.
+MIGRATIONS: List[Tuple[str, List[Statement]]] = [
+    ("0000_initial_schema", [_create_schema]),
+    (
+        "0001_composite_indexes",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_messages_conversation "
+            "ON messages (file_id, user_id, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_votes_message_id ON votes (message_id)",
+            "CREATE INDEX IF NOT EXISTS ix_pdfs_user_created ON pdfs (user_id, created_at)",
+        ],
+    ),
+    # New tables only, create_all skips the existing ones
+    ("0002_active_generations", [_create_schema]),
+]
+
+
+def _lock(connection: Connection):
+    """Serialize migrations across processes"""
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+        connection.commit()
+    elif connection.dialect.name == "sqlite":
+        # The driver would only BEGIN before DML, leaving DDL outside the
+        # transaction; _begin issues BEGIN IMMEDIATE itself instead
+        connection.connection.driver_connection.isolation_level = None
+
+
+def _unlock(connection: Connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+        connection.commit()
+    elif connection.dialect.name == "sqlite":
+        connection.connection.driver_connection.isolation_level = ""
+
+
+@contextmanager
+def _begin(connection: Connection) -> Iterator[None]:
+    """A transaction that on SQLite holds the write lock from its start"""
+    with connection.begin():
+        if connection.dialect.name == "sqlite":
+            # Other workers wait (busy_timeout) until this one commits
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        yield
+
+
+def _is_applied(connection: Connection, migration_id: str) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM schema_migrations WHERE id = :id"), {"id": migration_id}
+    ).first() is not None
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply pending migrations, each in its own transaction. Returns their ids."""
+    newly_applied = []
+    with engine.connect() as connection:
+        _lock(connection)
+        try:
+            with _begin(connection):
+                connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "id VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+                ))
+                applied = {
+                    row[0] for row in connection.execute(text("SELECT id FROM schema_migrations"))
+                }
+
+            for migration_id, statements in MIGRATIONS:
+                if migration_id in applied:
+                    continue
+                try:
+                    with _begin(connection):
+                        # Another worker may have applied it while this one waited
+                        if _is_applied(connection, migration_id):
+                            continue
+                        for statement in statements:
+                            if callable(statement):
+                                statement(connection)
+                            else:
+                                connection.execute(text(statement))
+                        connection.execute(
+                            text(
+                                "INSERT INTO schema_migrations (id, applied_at) "
+                                "VALUES (:id, :applied_at) ON CONFLICT (id) DO NOTHING"
+                            ),
+                            {"id": migration_id, "applied_at": datetime.utcnow()},
+                        )
+                except Exception as e:
+                    logger.error(f"Migration {migration_id} failed: {str(e)}")
+                    raise
+                logger.info(f"Applied migration {migration_id}")
+                newly_applied.append(migration_id)
+        finally:
+            _unlock(connection)
+    return newly_applied
+
+
+def main():
+    from app.db.session import engine
+
+    applied = run_migrations(engine)
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied) or 'none pending'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+EXPLAIN QUERY PLAN check of the repository queries behind authentication
+and the chat, history, vote and page endpoints. The repository methods
+themselves are run against a scratch SQLite database built by the
+migrations and every statement they send is explained, so the check always
+sees the queries as they are written. Run `python -m app.db.query_plans`
+after schema or query changes: it exits non-zero if any statement scans a
+whole table. The test suite runs the same check.
+"""
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.core.database import Base
+from app.crud.user import get_user_by_email
+from app.db.migrations import run_migrations
+from app.repositories.chat_repository import ChatRepository, encode_cursor
+from app.repositories.generation_repository import GenerationRepository
+from app.repositories.pdf_repository import PDFRepository
+
+_CHAT = ChatRepository()
+_GENERATIONS = GenerationRepository()
+_OLDER_THAN = encode_cursor(SimpleNamespace(created_at=datetime(2024, 1, 1), id=100))
+
+# Repository calls with placeholder arguments. The question and answer are
+# saved before the vote, so the vote finds its assistant message (id 2).
+HOT_CALLS: Dict[str, Callable[[AsyncSession], Awaitable]] = {
+    "current user": lambda db: get_user_by_email(db, "user@example.com"),
+    "history newest page": lambda db: _CHAT.get_history_page(db, "f", 1, 50),
+    "history older page": lambda db: _CHAT.get_history_page(
+        db, "f", 1, 50, before=_OLDER_THAN),
+    "messages after id": lambda db: _CHAT.get_messages_after(db, "f", 1, 100),
+    "save question and answer": lambda db: _CHAT.save_message_pair(db, 1, "f", "q", "a"),
+    "vote": lambda db: _CHAT.apply_vote(db, 1, "f", 2, "upvote"),
+    "clear history": lambda db: _CHAT.delete_chat_history(db, "f", 1),
+    "user pdfs": lambda db: PDFRepository.get_user_pdfs(1, db),
+    "pdf by id": lambda db: PDFRepository.get_pdf_by_id("f", db),
+    "user pdf": lambda db: PDFRepository.get_user_pdf("f", 1, db),
+    "pdf by filename": lambda db: PDFRepository.get_pdf_by_filename("a.pdf", 1, db),
+    "accessible pdf": lambda db: PDFRepository.get_accessible_pdf("f", 1, db),
+    "claim generation": lambda db: _GENERATIONS.claim(db, 1, "t"),
+    "poll generation": lambda db: _GENERATIONS.is_active(db, 1, "t"),
+    "release generation": lambda db: _GENERATIONS.release(db, 1, "t"),
+}
+
+Statement = Tuple[str, tuple]
+
+# "SCAN messages" reads the whole table, "SCAN 2 CONSTANT ROWS" is a VALUES list
+_SCAN = re.compile(r"SCAN (\w+)")
+
+
+async def _capture(path: str) -> Dict[str, List[Statement]]:
+    """Statements (SQL, parameters) each hot call sends, in order"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    captured: Dict[str, List[Statement]] = {name: [] for name in HOT_CALLS}
+    current = None
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def record(connection, cursor, statement, parameters, context, executemany):
+        captured[current].append((statement, tuple(parameters)))
+
+    try:
+        for current, call in HOT_CALLS.items():
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                await call(db)
+    finally:
+        await engine.dispose()
+    return captured
+
+
+def explain_hot_calls() -> Dict[str, List[Tuple[str, List[str]]]]:
+    """(SQL, EXPLAIN QUERY PLAN detail lines) of every statement of each hot call"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "plans.db")
+        engine = create_engine(f"sqlite:///{path}")
+        try:
+            run_migrations(engine)
+            captured = asyncio.run(_capture(path))
+            with engine.connect() as connection:
+                return {
+                    name: [
+                        (sql, [
+                            row[-1] for row in connection.exec_driver_sql(
+                                f"EXPLAIN QUERY PLAN {sql}", parameters)
+                        ])
+                        for sql, parameters in statements
+                    ]
+                    for name, statements in captured.items()
+                }
+        finally:
+            engine.dispose()
+
+
+def _scans_table(line: str) -> bool:
+    match = _SCAN.match(line)
+    return bool(match) and match.group(1) in Base.metadata.tables and " USING " not in line
+
+
+def find_table_scans() -> Dict[str, List[str]]:
+    """Plans of the hot calls' statements that read a table without an index"""
+    scans = {}
+    for name, statements in explain_hot_calls().items():
+        for _, plan in statements:
+            if any(_scans_table(line) for line in plan):
+                scans.setdefault(name, []).extend(plan)
+    return scans
+
+
+def main() -> int:
+    scans = find_table_scans()
+    for name, plan in scans.items():
+        print(f"Table scan in {name}: {'; '.join(plan)}")
+    if not scans:
+        print(f"All {len(HOT_CALLS)} hot repository calls use indexes")
+    return 1 if scans else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,170 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
 from app.core.config import settings
+from app.core.metrics import metrics
 
-# Create SQLite engine with special configuration for SQLite
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Needed for SQLite
-    poolclass=StaticPool,  # Better for FastAPI's async nature with SQLite
-)
+
+class _TimedCheckout:
+    """Record how long checkouts wait for a connection, per pool role"""
+
+    def connect(self):
+        role = self.logging_name
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            metrics.counter(f"db_{role}_pool_timeouts").inc()
+            raise
+        finally:
+            metrics.histogram(f"db_{role}_pool_wait_seconds").observe(
+                time.perf_counter() - started_at)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# Asyncio driver of each backend, by its default driver URL scheme
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """The same database through its asyncio driver"""
+    scheme, separator, rest = url.partition("://")
+    if scheme in _ASYNC_DRIVERS:
+        return f"{_ASYNC_DRIVERS[scheme]}{separator}{rest}"
+    return url
+
+
+def sync_database_url(url: str) -> str:
+    """URL for the synchronous engine, postgres:// accepted as on most hosts"""
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(sync_database_url(url)).get_backend_name() == "sqlite"
+
+
+def write_pool_size(url: str) -> int:
+    """SQLite serializes writers, so more write connections would only wait"""
+    if settings.DB_WRITE_POOL_SIZE is not None:
+        return settings.DB_WRITE_POOL_SIZE
+    return 1 if is_sqlite(url) else settings.DB_READ_POOL_SIZE
+
+
+def is_memory_sqlite(url: str) -> bool:
+    """In-memory SQLite, one database per connection"""
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+def _sqlite_pragmas(read_only: bool):
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_BYTES}",
+        # Negative sizes are in KiB rather than pages
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KIB}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def _engine_options(url: str, role: str, pool_size: int, pool_class) -> dict:
+    if is_memory_sqlite(url):
+        # Every connection would see its own empty database
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    options = {
+        "poolclass": pool_class,
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_logging_name": role,
+    }
+    if not is_sqlite(url):
+        # Server connections can be dropped by the server or a proxy when idle
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE_SECONDS
+    return options
+
+
+def _configure(sync_engine: Engine, url: str, read_only: bool):
+    if is_sqlite(url) and not is_memory_sqlite(url):
+        event.listen(sync_engine, "connect", _sqlite_pragmas(read_only))
+
+
+def create_db_engine(url: str, role: str, pool_size: int, read_only: bool = False) -> Engine:
+    """Engine with a sized, timed pool, and WAL and cache pragmas on SQLite"""
+    url = sync_database_url(url)
+    options = _engine_options(url, role, pool_size, TimedQueuePool)
+    if read_only and not is_sqlite(url):
+        options["connect_args"] = {"options": "-c default_transaction_read_only=on"}
+    engine = create_engine(url, **options)
+    _configure(engine, url, read_only)
+    return engine
+
+
+def create_async_db_engine(
+    url: str, role: str, pool_size: int, read_only: bool = False
+) -> AsyncEngine:
+    """Asyncio counterpart of create_db_engine"""
+    options = _engine_options(url, role, pool_size, TimedAsyncQueuePool)
+    if read_only and not is_sqlite(url):
+        options["connect_args"] = {
+            "server_settings": {"default_transaction_read_only": "on"}}
+    engine = create_async_engine(async_database_url(url), **options)
+    _configure(engine.sync_engine, url, read_only)
+    return engine
+
+
+# Schema setup, migrations and scripts, one connection is enough
+engine = create_db_engine(settings.DATABASE_URL, "sync", 1)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Request handling goes through the async engines so queries never block the
+# event loop. On SQLite writes share a small pool, as they are serialized
+# anyway, while WAL lets the read pool's connections run alongside them.
+async_engine = create_async_db_engine(
+    settings.DATABASE_URL, "write", write_pool_size(settings.DATABASE_URL))
+async_read_engine = (
+    async_engine if is_memory_sqlite(settings.DATABASE_URL)
+    else create_async_db_engine(
+        settings.DATABASE_URL, "read", settings.DB_READ_POOL_SIZE, read_only=True)
+)
+
+# Objects stay readable after commit, as they are rendered once the
+# session is gone
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, autoflush=False, expire_on_commit=False
+)
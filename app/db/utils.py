@@ -1,6 +1,11 @@
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator
 
-from app.db.session import SessionLocal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import (AsyncReadSessionLocal, AsyncSessionLocal,
+                            SessionLocal)
 
 
 @contextmanager
@@ -10,3 +15,22 @@ def get_db_session():
         yield db
     finally:
         db.close()
+
+
+@asynccontextmanager
+async def get_async_db_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def get_async_read_db_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def upsert_insert(db: AsyncSession, model):
+    """INSERT for the session's backend, with on_conflict_do_update/nothing"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
@@ -1,4 +1,7 @@
+import asyncio
 import os
+import secrets
+import time
 
 import httpx
 from fastapi import FastAPI, Request, WebSocketDisconnect
@@ -8,21 +11,28 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from app import IMPORT_STARTED_AT
 # Import API routers
 from app.api.endpoints import auth as auth_api
 from app.api.endpoints import chat as chat_api
 from app.api.endpoints import pdf as pdf_api
 from app.core.config import settings
 # Import database and models first
-from app.core.database import create_tables, drop_tables
+from app.core.database import drop_tables, engine
+from app.db.migrations import run_migrations
+from app.db.session import async_engine, async_read_engine
 from app.core.jinja_filters import dict_item, fromjson
+from app.core.loop_monitor import EventLoopLagMonitor
+from app.core.metrics import metrics
 from app.core.middleware import (add_auth_header, auth_middleware,
                                  websocket_cors)
+from app.core.service_container import services
 from app.core.websocket_manager import WebSocketManager
 from app.routers import pages as pages_router
 from app.utils.logging import get_api_logger
 
 logger = get_api_logger("Main")
+IMPORTS_FINISHED_AT = time.perf_counter()
 
 # Get the absolute path to the app directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -95,15 +105,88 @@ app.include_router(pages_router.router, tags=["pages"])
 
 @ app.on_event("startup")
 async def startup_event():
+    startup_started_at = time.perf_counter()
     logger.info("Starting up application")
     if settings.DROP_DB_ON_STARTUP:
         logger.warning("Dropping all tables due to DROP_DB_ON_STARTUP setting")
         drop_tables()
-    logger.info("Creating all tables")
-    create_tables()
+    # Creates the tables on a new database; several workers may run this at once
+    logger.info("Applying database migrations")
+    run_migrations(engine)
+
+    # Heavy resources load in the background while the server starts listening
+    app.state.warm_up_task = asyncio.create_task(services.warm_up())
+
+    if settings.EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        app.state.loop_monitor = EventLoopLagMonitor(
+            settings.EVENT_LOOP_LAG_INTERVAL_SECONDS,
+            settings.EVENT_LOOP_LAG_WARN_SECONDS,
+        )
+        app.state.loop_monitor.start()
+
+    log_startup_report(startup_started_at)
     logger.info("Application startup complete")
 
 
+@ app.on_event("shutdown")
+async def shutdown_event():
+    loop_monitor = getattr(app.state, "loop_monitor", None)
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    await services.shutdown()
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+
+def log_startup_report(startup_started_at: float):
+    """Log import and startup time against the startup budget"""
+    now = time.perf_counter()
+    report = {
+        "import_seconds": round(IMPORTS_FINISHED_AT - IMPORT_STARTED_AT, 3),
+        "startup_seconds": round(now - startup_started_at, 3),
+        "total_seconds": round(now - IMPORT_STARTED_AT, 3),
+        "budget_seconds": settings.STARTUP_BUDGET_SECONDS,
+    }
+    app.state.startup_report = report
+
+    message = (
+        f"Startup budget report: imports {report['import_seconds']:.3f}s, "
+        f"startup {report['startup_seconds']:.3f}s, "
+        f"total {report['total_seconds']:.3f}s "
+        f"(budget {report['budget_seconds']:.2f}s)"
+    )
+    if report["total_seconds"] > settings.STARTUP_BUDGET_SECONDS:
+        logger.warning(f"{message} - over budget")
+    else:
+        logger.info(message)
+
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """In-process counters, gauges and latency histograms, for holders of METRICS_TOKEN"""
+    # Returned rather than raised, scrapers do not ask for JSON errors
+    if not settings.METRICS_TOKEN:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    authorization = request.headers.get("authorization", "")
+    if not secrets.compare_digest(
+        authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    ):
+        return JSONResponse(
+            status_code=401,
+            content={"detail": "Invalid metrics token"},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    snapshot = metrics.snapshot()
+    if services.embed_hosts and services.generate_hosts:
+        snapshot["ollama_hosts"] = {
+            "embed": services.embed_hosts.snapshot(),
+            "generate": services.generate_hosts.snapshot(),
+        }
+    return snapshot
+
+
 @app.get("/health")
 async def health_check():
     try:
@@ -131,7 +214,9 @@ async def health_check():
             "ollama": "ready",
             "models": {
                 "status": "ready",
-                "available": list(available_models)
+                "available": list(available_models),
+                # Which hosts have the models loaded, per role and URL
+                "warm": services.model_warmer.warm if services.model_warmer else {},
             }
         }
     except Exception as e:
@@ -1,6 +1,8 @@
+from app.models.domain.generation import ActiveGeneration
 from app.models.domain.message import Message
 from app.models.domain.pdf import PDF
 from app.models.domain.user import User
+from app.models.domain.vote import Vote
 
 # This ensures all models are imported and available
-__all__ = ['User', 'Message', 'PDF']
+__all__ = ['User', 'Message', 'PDF', 'Vote', 'ActiveGeneration']
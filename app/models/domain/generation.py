@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from app.core.database import Base
+
+
+class ActiveGeneration(Base):
+    """The newest generation of a user, shared by every worker process"""
+    __tablename__ = "active_generations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    token = Column(String(32), nullable=False)  # Identifies the generation
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
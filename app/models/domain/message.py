@@ -1,7 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import (JSON, Column, DateTime, ForeignKey, Integer, String,
-                        Text)
+from sqlalchemy import (JSON, Column, DateTime, ForeignKey, Index, Integer,
+                        String, Text)
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -20,6 +20,11 @@ class Message(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # One conversation is (file_id, user_id), always read in (created_at, id) order
+    __table_args__ = (
+        Index("ix_messages_conversation", "file_id", "user_id", "created_at", "id"),
+    )
+
     # Use string references for relationships
     user = relationship("User", back_populates="messages")
     votes = relationship("Vote", backref="message",
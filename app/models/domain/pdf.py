@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Index, Integer,
+                        String)
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -17,5 +18,10 @@ class PDF(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     is_processed = Column(Boolean, default=False)
 
+    # A user's PDFs are listed newest first
+    __table_args__ = (
+        Index("ix_pdfs_user_created", "user_id", "created_at"),
+    )
+
     # Use string references for relationships
     user = relationship("User", back_populates="pdfs")
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import (Column, ForeignKey, Index, Integer, String,
+                        UniqueConstraint)
 
 from app.core.database import Base
 
@@ -11,10 +12,12 @@ class Vote(Base):
     message_id = Column(Integer, ForeignKey("messages.id"))
     vote_type = Column(String(10))  # "upvote" or "downvote"
 
-    # Ensure one vote per user per message
+    # Ensure one vote per user per message; the constraint's index also
+    # serves lookups by (user_id, message_id)
     __table_args__ = (
         UniqueConstraint('user_id', 'message_id',
                          name='uix_user_message_vote'),
+        Index("ix_votes_message_id", "message_id"),
     )
 
     class Config:
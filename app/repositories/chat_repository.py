@@ -1,58 +1,226 @@
-from typing import List, Optional
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (Row, Select, and_, case, delete, insert, null, or_,
+                        select, update)
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.utils import upsert_insert
 from app.models.domain.message import Message
+from app.models.domain.vote import Vote
+
+
+def encode_cursor(message: Union[Message, Row]) -> str:
+    """Opaque cursor pointing just before `message` in its conversation"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) of a cursor, ValueError if it is malformed"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor}")
 
 
 class ChatRepository:
-    def get_chat_history(
+    def _message_rows(self, file_id: str, user_id: int) -> Select:
+        """
+        Messages of a conversation as plain rows with the user's vote on each
+        (None if they did not vote), joined in the same query
+        """
+        return select(
+            Message.id,
+            Message.role,
+            Message.content,
+            Message.sources,
+            Message.upvotes,
+            Message.downvotes,
+            Message.created_at,
+            Vote.vote_type.label("user_vote"),
+        ).outerjoin(
+            Vote, and_(Vote.message_id == Message.id, Vote.user_id == user_id)
+        ).where(
+            Message.file_id == file_id,
+            Message.user_id == user_id
+        )
+
+    async def get_history_page(
         self,
-        db: Session,
+        db: AsyncSession,
         file_id: str,
         user_id: int,
-        limit: Optional[int] = None
-    ) -> List[Message]:
-        query = db.query(Message).filter(
-            Message.file_id == file_id,
-            Message.user_id == user_id
-        ).order_by(Message.created_at.asc())
+        limit: int,
+        before: Optional[str] = None
+    ) -> Tuple[List[Row], Optional[str]]:
+        """
+        Newest `limit` message rows older than the `before` cursor, oldest
+        first, with the cursor of the next older page (None on the first
+        message). Keyset pagination on (created_at, id), so deep pages cost
+        the same as the first one.
+        """
+        query = self._message_rows(file_id, user_id)
+        if before:
+            created_at, message_id = decode_cursor(before)
+            query = query.where(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id)
+            ))
 
-        if limit:
-            query = query.limit(limit)
+        # One extra row tells whether an older page exists
+        result = await db.execute(query.order_by(
+            Message.created_at.desc(), Message.id.desc()
+        ).limit(limit + 1))
+        rows = result.all()
+        messages = rows[:limit][::-1]
+        next_cursor = encode_cursor(messages[0]) if len(rows) > limit else None
+        return messages, next_cursor
 
-        return query.all()
+    async def get_messages_after(
+        self,
+        db: AsyncSession,
+        file_id: str,
+        user_id: int,
+        after_id: int
+    ) -> List[Row]:
+        """Message rows of the conversation newer than the message `after_id`"""
+        result = await db.execute(self._message_rows(file_id, user_id).where(
+            Message.id > after_id
+        ).order_by(Message.created_at.asc(), Message.id.asc()))
+        return result.all()
 
-    def save_message(
+    async def save_message_pair(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         file_id: str,
-        content: str,
-        role: str,
-        sources: dict = None
-    ) -> Message:
-        message = Message(
-            user_id=user_id,
-            file_id=file_id,
-            content=content,
-            role=role,
-            sources=sources
+        question: str,
+        answer: str,
+        sources: Optional[list] = None
+    ) -> Tuple[Message, Message]:
+        """
+        Store a question and its answer in one transaction: a single
+        multi-row INSERT returning both ids and one commit. Every column is
+        known client-side, so the messages are built here rather than
+        reloaded with a refresh.
+        """
+        # One timestamp for the pair; the id keeps the question first
+        shared = {
+            "user_id": user_id,
+            "file_id": file_id,
+            "upvotes": 0,
+            "downvotes": 0,
+            "created_at": datetime.utcnow(),
+        }
+        pair = (("user", question, None), ("assistant", answer, sources))
+        try:
+            result = await db.execute(
+                insert(Message).values([
+                    # SQL NULL rather than a JSON null for missing sources
+                    {**shared, "role": role, "content": content,
+                     "sources": null() if message_sources is None else message_sources}
+                    for role, content, message_sources in pair
+                ]).returning(Message.role, Message.id)
+            )
+            ids = dict(result.all())
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return tuple(
+            Message(id=ids[role], role=role, content=content, sources=message_sources, **shared)
+            for role, content, message_sources in pair
         )
-        db.add(message)
-        db.commit()
-        db.refresh(message)
-        return message
 
-    def delete_chat_history(
+    async def delete_chat_history(
         self,
-        db: Session,
+        db: AsyncSession,
         file_id: str,
         user_id: int
     ) -> bool:
-        db.query(Message).filter(
+        await db.execute(delete(Message).where(
             Message.file_id == file_id,
             Message.user_id == user_id
-        ).delete()
-        db.commit()
+        ))
+        await db.commit()
         return True
+
+    async def apply_vote(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        file_id: str,
+        message_id: int,
+        vote_type: str
+    ) -> Optional[Tuple[int, int, Optional[str]]]:
+        """
+        Cast, switch or (voting the same way again) withdraw the user's vote
+        on an assistant message in one transaction. The message row is
+        locked before the previous vote is read, so concurrent votes on it
+        take turns and every counter change matches the vote it records.
+        Returns (upvotes, downvotes, user's vote now), None if no such
+        message, in which case nothing changes.
+        """
+        try:
+            # A no-op UPDATE rather than SELECT ... FOR UPDATE: it row-locks
+            # on PostgreSQL and takes the write lock up front on SQLite
+            message = (
+                Message.id == message_id,
+                Message.file_id == file_id,
+                Message.role == "assistant"  # Only assistant messages are votable
+            )
+            locked = await db.scalar(
+                update(Message)
+                .where(*message)
+                .values(upvotes=Message.upvotes)
+                .returning(Message.id)
+                .execution_options(synchronize_session=False)
+            )
+            if locked is None:
+                await db.rollback()
+                return None
+
+            previous = await db.scalar(
+                delete(Vote)
+                .where(Vote.user_id == user_id, Vote.message_id == message_id)
+                .returning(Vote.vote_type)
+            )
+
+            user_vote = None if previous == vote_type else vote_type
+            if user_vote:
+                await db.execute(
+                    upsert_insert(db, Vote)
+                    .values(user_id=user_id, message_id=message_id, vote_type=user_vote)
+                    .on_conflict_do_update(
+                        index_elements=[Vote.user_id, Vote.message_id],
+                        set_={"vote_type": user_vote},
+                    )
+                )
+
+            deltas = {
+                column: (user_vote == kind) - (previous == kind)
+                for column, kind in (("upvotes", "upvote"), ("downvotes", "downvote"))
+            }
+            result = await db.execute(
+                update(Message)
+                .where(*message)
+                .values({
+                    column: case(
+                        (getattr(Message, column) + delta < 0, 0),
+                        else_=getattr(Message, column) + delta,
+                    )
+                    for column, delta in deltas.items()
+                })
+                .returning(Message.upvotes, Message.downvotes)
+                .execution_options(synchronize_session=False)
+            )
+            counts = result.one()
+            await db.commit()
+            return counts.upvotes, counts.downvotes, user_vote
+        except Exception:
+            await db.rollback()
+            raise
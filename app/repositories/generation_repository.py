@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.utils import upsert_insert
+from app.models.domain.generation import ActiveGeneration
+
+
+class GenerationRepository:
+    async def claim(self, db: AsyncSession, user_id: int, token: str):
+        """Make `token` the user's active generation, superseding any other"""
+        started_at = datetime.utcnow()
+        await db.execute(
+            upsert_insert(db, ActiveGeneration)
+            .values(user_id=user_id, token=token, started_at=started_at)
+            .on_conflict_do_update(
+                index_elements=[ActiveGeneration.user_id],
+                set_={"token": token, "started_at": started_at},
+            )
+        )
+        await db.commit()
+
+    async def is_active(self, db: AsyncSession, user_id: int, token: str) -> bool:
+        """Whether `token` is still the user's active generation"""
+        active = await db.scalar(
+            select(ActiveGeneration.token).where(ActiveGeneration.user_id == user_id))
+        return active == token
+
+    async def release(self, db: AsyncSession, user_id: int, token: str):
+        """Forget the generation, unless a newer one already took its place"""
+        await db.execute(delete(ActiveGeneration).where(
+            ActiveGeneration.user_id == user_id, ActiveGeneration.token == token))
+        await db.commit()
@@ -1,32 +1,54 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.domain.pdf import PDF
 
 
 class PDFRepository:
     @staticmethod
-    async def get_user_pdfs(user_id: int, db: Session) -> List[PDF]:
+    async def get_user_pdfs(user_id: int, db: AsyncSession) -> List[PDF]:
         """Get all PDFs belonging to a user"""
-        return db.query(PDF).filter(PDF.user_id == user_id).order_by(PDF.created_at.desc()).all()
+        pdfs = await db.scalars(
+            select(PDF).where(PDF.user_id == user_id).order_by(PDF.created_at.desc()))
+        return pdfs.all()
 
     @staticmethod
-    async def get_pdf_by_id(file_id: str, db: Session) -> PDF:
+    async def get_pdf_by_id(file_id: str, db: AsyncSession) -> PDF:
         """Get PDF by file_id"""
-        return db.query(PDF).filter(PDF.file_id == file_id).first()
+        return await db.scalar(select(PDF).where(PDF.file_id == file_id))
 
     @staticmethod
-    def get_pdf_by_filename(filename: str, user_id: int, db: Session) -> PDF:
+    async def get_user_pdf(file_id: str, user_id: int, db: AsyncSession) -> PDF:
+        """Get PDF by file_id if it belongs to the user, processed or not"""
+        return await db.scalar(select(PDF).where(
+            PDF.file_id == file_id, PDF.user_id == user_id))
+
+    @staticmethod
+    async def get_pdf_by_filename(filename: str, user_id: int, db: AsyncSession) -> PDF:
         """Get PDF by filename and user_id"""
-        return db.query(PDF).filter(PDF.filename == filename, PDF.user_id == user_id).first()
+        return await db.scalar(select(PDF).where(
+            PDF.filename == filename, PDF.user_id == user_id))
 
     @staticmethod
-    async def verify_pdf_access(self, file_id: str, user_id: int, db: Session) -> bool:
-        """Verify if user has access to the PDF"""
-        pdf = db.query(PDF).filter(
+    async def get_accessible_pdf(file_id: str, user_id: int, db: AsyncSession) -> PDF:
+        """Get the PDF if it belongs to the user and is processed"""
+        return await db.scalar(select(PDF).where(
             PDF.file_id == file_id,
             PDF.user_id == user_id,
             PDF.is_processed == True
-        ).first()
+        ))
+
+    @staticmethod
+    async def verify_pdf_access(file_id: str, user_id: int, db: AsyncSession) -> bool:
+        """Verify if user has access to the PDF"""
+        return await PDFRepository.get_accessible_pdf(file_id, user_id, db)
+
+    @staticmethod
+    async def create_pdf(db: AsyncSession, **fields) -> PDF:
+        pdf = PDF(**fields)
+        db.add(pdf)
+        await db.commit()
+        await db.refresh(pdf)
         return pdf
@@ -3,18 +3,17 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_read_db
 from app.core.security import get_current_user, get_current_user_or_none
-from app.models.domain.message import Message as MessageModel
-from app.models.domain.pdf import PDF as PDFModel
 from app.models.domain.user import User
-from app.models.domain.vote import Vote as VoteModel
+from app.repositories.chat_repository import ChatRepository
 from app.repositories.pdf_repository import PDFRepository
 
 router = APIRouter()
+chat_repository = ChatRepository()
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -36,7 +35,7 @@ async def home(
 async def pdfs_page(
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     try:
         pdf_repository = PDFRepository()
@@ -105,50 +104,27 @@ async def chat_page(
     request: Request,
     file_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """Render chat page with PDF viewer"""
     # Verify PDF exists and user has access
-    pdf = db.query(PDFModel).filter(
-        PDFModel.file_id == file_id,
-        PDFModel.user_id == current_user.id
-    ).first()
+    pdf = await PDFRepository.get_user_pdf(file_id, current_user.id, db)
 
     if not pdf:
         raise HTTPException(status_code=404, detail="PDF not found")
 
-    # Get existing messages
-    messages = (
-        db.query(MessageModel)
-        .filter(
-            MessageModel.file_id == file_id,
-            MessageModel.user_id == current_user.id
-        )
-        .order_by(MessageModel.created_at.asc())
-        .all()
-    )
-
-    # Get user votes
-    message_ids = [message.id for message in messages]
-    user_votes = {}
-    if message_ids:
-        votes = (
-            db.query(VoteModel)
-            .filter(
-                VoteModel.user_id == current_user.id,
-                VoteModel.message_id.in_(message_ids)
-            )
-            .all()
-        )
-        user_votes = {vote.message_id: vote.vote_type for vote in votes}
+    # Newest page of messages with the user's votes, older ones load on scroll
+    messages, next_cursor = await chat_repository.get_history_page(
+        db, file_id, current_user.id, settings.CHAT_HISTORY_PAGE_SIZE)
 
     return request.app.state.templates.TemplateResponse(
         "chat.html",
         {
             "request": request,
             "pdf": pdf,
+            "file_id": file_id,
             "messages": messages,
-            "user_votes": user_votes,
+            "next_cursor": next_cursor,
             "user": current_user
         }
     )
@@ -0,0 +1,178 @@
+import copy
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from app.services.query_cache import CacheKey, QueryCache, QueryCacheEntry
+from app.utils.logging import get_service_logger
+
+logger = get_service_logger("answer_cache")
+
+# Rough per-entry bookkeeping cost on top of the payload
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+@dataclass
+class _AnswerEntry(QueryCacheEntry):
+    response: str
+    sources: List[Dict]
+    size_bytes: int
+    message_ids: Set[int] = field(default_factory=set)
+
+
+class AnswerCache(QueryCache):
+    """
+    TTL + LRU cache of generated answers per (file_id, query), bounded by an
+    approximate memory budget rather than an entry count.
+
+    Paraphrased questions are served from an entry of the same document whose
+    query embedding is within the similarity threshold. Every message that
+    showed a cached answer is tracked, so a net downvote on any of them
+    evicts the answer and keeps its query from being cached again for one TTL.
+    Blocked queries are LRU-bounded to as many as the budget holds entries.
+    """
+
+    entry_name = "answers"
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+    ):
+        super().__init__(ttl_seconds, similarity_threshold)
+        self.max_bytes = max_bytes
+        self._key_by_message: Dict[int, CacheKey] = {}
+        # Query key -> when it may be cached again
+        self._blocked_queries: "OrderedDict[CacheKey, float]" = OrderedDict()
+        self.max_blocked_queries = max(max_bytes // _ENTRY_OVERHEAD_BYTES, 1)
+        self.size_bytes = 0
+        logger.info(
+            f"AnswerCache initialized with max_bytes={max_bytes}, "
+            f"ttl={ttl_seconds}s, similarity_threshold={similarity_threshold}"
+        )
+
+    def _is_full(self) -> bool:
+        return self.size_bytes > self.max_bytes
+
+    def _removed(self, key: CacheKey, entry: _AnswerEntry):
+        self.size_bytes -= entry.size_bytes
+        for message_id in entry.message_ids:
+            self._key_by_message.pop(message_id, None)
+
+    def _is_blocked(self, key: CacheKey) -> bool:
+        blocked_until = self._blocked_queries.get(key)
+        if blocked_until is None:
+            return False
+        if blocked_until < time.monotonic():
+            del self._blocked_queries[key]
+            return False
+        return True
+
+    def _block(self, key: CacheKey):
+        self._blocked_queries[key] = time.monotonic() + self.ttl_seconds
+        self._blocked_queries.move_to_end(key)
+        while len(self._blocked_queries) > self.max_blocked_queries:
+            self._blocked_queries.popitem(last=False)
+
+    def _hit(self, key: CacheKey, entry: _AnswerEntry) -> Dict:
+        self._touch(key)
+        return {
+            "response": entry.response,
+            "sources": copy.deepcopy(entry.sources),
+            "cached": True,
+            "answer_key": key,
+        }
+
+    def get(
+        self, file_id: str, query: str, embedding: Optional[List[float]] = None
+    ) -> Optional[Dict]:
+        """
+        Look up an answer by normalized query, then by query embedding when
+        one is given. Returns {"response", "sources", "cached", "answer_key"}.
+        """
+        key = self.key(file_id, query)
+        entry = self._lookup(key)
+        if entry is not None:
+            logger.info(f"Answer cache hit for file_id: {file_id}")
+            return self._hit(key, entry)
+
+        if embedding is None:
+            return None
+        match = self._lookup_similar(file_id, embedding)
+        if match is None:
+            self.misses += 1
+            return None
+
+        similar_key, similar_entry, similarity = match
+        logger.info(
+            f"Answer cache approximate hit for file_id: {file_id} "
+            f"(similarity={similarity:.4f})"
+        )
+        return self._hit(similar_key, similar_entry)
+
+    def put(
+        self,
+        file_id: str,
+        query: str,
+        embedding: Optional[List[float]],
+        response: str,
+        sources: List[Dict],
+    ) -> Optional[CacheKey]:
+        """Cache an answer, returns its key or None if it was not cached"""
+        key = self.key(file_id, query)
+        if self._is_blocked(key):
+            return None
+
+        vector = self._unit(embedding) if embedding is not None else None
+        size_bytes = (
+            _ENTRY_OVERHEAD_BYTES
+            + len(response.encode("utf-8"))
+            + len(json.dumps(sources))
+            + (vector.nbytes if vector is not None else 0)
+        )
+        if size_bytes > self.max_bytes:
+            return None
+
+        # Counted before inserting, so eviction sees the new size
+        self._remove(key)
+        self.size_bytes += size_bytes
+        self._insert(key, _AnswerEntry(
+            embedding=vector,
+            expires_at=self._expires_at(),
+            response=response,
+            sources=copy.deepcopy(sources),
+            size_bytes=size_bytes,
+        ))
+        return key
+
+    def link_message(self, key: CacheKey, message_id: int):
+        """Remember that a stored assistant message shows a cached answer"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.message_ids.add(message_id)
+            self._key_by_message[message_id] = key
+
+    def record_vote(self, message_id: int, upvotes: int, downvotes: int):
+        """Evict an answer and stop caching its query once it is net downvoted"""
+        key = self._key_by_message.get(message_id)
+        if key is None or downvotes <= upvotes:
+            return
+        self._remove(key)
+        self._block(key)
+        logger.info(
+            f"Evicted downvoted answer for file_id: {key[0]} "
+            f"(message {message_id}: +{upvotes}/-{downvotes})"
+        )
+
+    def invalidate(self, file_id: str):
+        """Drop every cached answer for a document"""
+        super().invalidate(file_id)
+        # Answers to re-ingested content get a fresh chance
+        self._blocked_queries = OrderedDict(
+            (key, blocked_until)
+            for key, blocked_until in self._blocked_queries.items()
+            if key[0] != file_id
+        )
@@ -1,31 +1,60 @@
+import asyncio
 from datetime import datetime
-from typing import Dict, List
+from typing import AsyncGenerator, Awaitable, Dict, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.deadline import DeadlineExceeded, deadline_scope, within_deadline
+from app.core.metrics import stage_timer, timed_stage
+from app.db.utils import get_async_db_session, get_async_read_db_session
+from app.models.domain.message import Message
+
+from app.repositories.chat_repository import ChatRepository
 from app.repositories.pdf_repository import PDFRepository
+from app.services.answer_cache import AnswerCache
 from app.services.rag_pipeline.embeddings import OllamaEmbeddings
 from app.services.rag_pipeline.llm import OllamaLLM
-from app.services.rag_pipeline.vector_store import PineconeStore
+from app.services.rag_pipeline.vector_store import VectorStore
+from app.services.retrieval_cache import RetrievalCache
 from app.utils.logging import get_service_logger
 
 logger = get_service_logger("chat_service")
 
+NO_CONTEXT_RESPONSE = (
+    "I couldn't find any relevant information in the document to answer your question. "
+    "Could you try rephrasing your question or being more specific?"
+)
+DEADLINE_RESPONSE = (
+    "Searching the document is taking longer than expected right now. "
+    "Please try your question again in a moment."
+)
+
 
 class ChatService:
     def __init__(
         self,
         embeddings: OllamaEmbeddings,
-        vector_store: PineconeStore,
+        vector_store: VectorStore,
         llm: OllamaLLM,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        request_deadline: Optional[float] = None,
+        history_page_size: int = 50,
     ):
         self.embeddings = embeddings
         self.vector_store = vector_store
         self.llm = llm
+        self.retrieval_cache = retrieval_cache
+        self.answer_cache = answer_cache
+        # End-to-end budget for embed + search + generate of one question
+        self.request_deadline = request_deadline
+        self.history_page_size = history_page_size
         self.pdf_repository = PDFRepository()
+        self.chat_repository = ChatRepository()
         logger.info(f"[{datetime.utcnow()}] ChatService initialized")
 
-    async def verify_pdf_access(self, file_id: str, user_id: int, db: Session) -> bool:
+    async def verify_pdf_access(self, file_id: str, user_id: int, db: AsyncSession) -> bool:
         """Verify if a user has access to a specific PDF"""
         return await self.pdf_repository.verify_pdf_access(file_id, user_id, db)
 
@@ -33,20 +62,41 @@ class ChatService:
         self,
         file_id: str,
         user_id: int,
-        db: Session,
-        limit: int = None
-    ) -> List[Dict]:
-        messages = self.chat_repository.get_chat_history(
-            db, file_id, user_id, limit)
+        db: AsyncSession,
+        limit: int = None,
+        before: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """One page of history as dicts, oldest first, and the older page cursor"""
+        messages, next_cursor = await self.chat_repository.get_history_page(
+            db, file_id, user_id, limit or self.history_page_size, before)
         return [
             {
+                "id": msg.id,
                 "role": msg.role,
                 "content": msg.content,
                 "sources": msg.sources,
                 "created_at": msg.created_at.isoformat()
             }
             for msg in messages
-        ]
+        ], next_cursor
+
+    async def get_history_page(
+        self,
+        file_id: str,
+        user_id: int,
+        db: AsyncSession,
+        before: Optional[str] = None
+    ) -> Tuple[List[Row], Optional[str]]:
+        """Message rows of one history page, with the user's votes, and the older page cursor"""
+        return await self.chat_repository.get_history_page(
+            db, file_id, user_id, self.history_page_size, before)
+
+    async def get_messages_after(
+        self, file_id: str, user_id: int, after_id: int, db: AsyncSession
+    ) -> List[Row]:
+        """Message rows newer than the message `after_id`, with the user's votes"""
+        return await self.chat_repository.get_messages_after(
+            db, file_id, user_id, after_id)
 
     async def save_message_pair(
         self,
@@ -54,28 +104,215 @@ class ChatService:
         file_id: str,
         user_message: str,
         assistant_response: Dict,
-        db: Session
-    ):
-        # Save user message
-        self.chat_repository.save_message(
+        db: AsyncSession
+    ) -> Tuple[Message, Message]:
+        """Store the question and its answer together, in one transaction"""
+        user_msg, assistant_msg = await self.chat_repository.save_message_pair(
             db=db,
             user_id=user_id,
             file_id=file_id,
-            content=user_message,
-            role="user"
-        )
-
-        # Save assistant response
-        self.chat_repository.save_message(
-            db=db,
-            user_id=user_id,
-            file_id=file_id,
-            content=assistant_response["response"],
-            role="assistant",
+            question=user_message,
+            answer=assistant_response["response"],
             sources=assistant_response.get("sources")
         )
+        self.link_answer_message(assistant_response, assistant_msg.id)
+        return user_msg, assistant_msg
+
+    async def _open_turn(
+        self, user_id: int, file_id: str, since: Optional[int] = None
+    ) -> Optional[Tuple[List[Row], Optional[str]]]:
+        """
+        Verify access and load the newest history page, with the user's
+        votes, and older page cursor in a read session of its own. With
+        `since`, only messages after that message id are loaded.
+        Returns None without access.
+        """
+        async with get_async_read_db_session() as db:
+            with timed_stage("verify_access"):
+                if not await self.pdf_repository.get_accessible_pdf(file_id, user_id, db):
+                    return None
+            with timed_stage("load_history"):
+                next_cursor = None
+                if since is None:
+                    messages, next_cursor = await self.chat_repository.get_history_page(
+                        db, file_id, user_id, self.history_page_size
+                    )
+                else:
+                    messages = await self.chat_repository.get_messages_after(
+                        db, file_id, user_id, since
+                    )
+            return messages, next_cursor
+
+    async def _save_turn(
+        self, user_id: int, file_id: str, user_message: str, assistant_response: Dict
+    ) -> Tuple[Message, Message]:
+        async with get_async_db_session() as db:
+            with timed_stage("save_turn"):
+                return await self.save_message_pair(
+                    user_id, file_id, user_message, assistant_response, db)
+
+    async def answer_turn(
+        self, query: str, file_id: str, user_id: int, since: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        One chat turn: the query is embedded while access is verified and the
+        history loaded in a session of their own. Search and generation only
+        start once access is confirmed; question and answer are then stored
+        in one transaction. Returns {"response", "messages", "next_cursor"} with
+        both appended to the newest history page, or None when the user has
+        no access.
+
+        `since` is the id of the last message the client already shows; only
+        newer messages are returned then, usually just this question and
+        answer, so the cost of a turn does not grow with the conversation.
+
+        Once the answer is generated it is stored even if the turn is
+        cancelled meanwhile, e.g. superseded by a newer query.
+        """
+        with stage_timer("chat_turn") as timer, deadline_scope(self.request_deadline):
+            # Only the embedding may run before access is confirmed, it touches
+            # neither the document nor the caches
+            embedding_task = asyncio.create_task(self._embed_query(query))
+            try:
+                turn = await self._open_turn(user_id, file_id, since)
+                if turn is None:
+                    return None
+                response = await self.get_response(
+                    query, file_id, None, user_id, query_embedding=embedding_task)
+            finally:
+                # Also unused when the answer came from an exact cache hit
+                embedding_task.cancel()
+
+            messages, next_cursor = turn
+            # A cancellation must not drop the answer or cut the commit short
+            question_message, answer_message = await asyncio.shield(
+                self._save_turn(user_id, file_id, query, response))
+            timer.report()
+        return {
+            "response": response,
+            "messages": messages + [question_message, answer_message],
+            "next_cursor": next_cursor,
+        }
+
+    def link_answer_message(self, assistant_response: Dict, message_id: int):
+        """Tie a stored message to its cached answer so votes on it count"""
+        answer_key = assistant_response.get("answer_key")
+        if self.answer_cache and answer_key:
+            self.answer_cache.link_message(answer_key, message_id)
+
+    async def vote(
+        self, user_id: int, file_id: str, message_id: int, vote_type: str, db: AsyncSession
+    ) -> Optional[Dict]:
+        """Apply a vote, None if the message cannot be voted on"""
+        result = await self.chat_repository.apply_vote(
+            db, user_id, file_id, message_id, vote_type)
+        if result is None:
+            return None
+        upvotes, downvotes, user_vote = result
+        # Net downvoted answers are no longer served from the answer cache
+        self.record_vote(message_id, upvotes, downvotes)
+        return {"upvotes": upvotes, "downvotes": downvotes, "userVote": user_vote}
+
+    def record_vote(self, message_id: int, upvotes: int, downvotes: int):
+        """Let vote totals of a message decide if its answer stays cached"""
+        if self.answer_cache:
+            self.answer_cache.record_vote(message_id, upvotes, downvotes)
+
+    @staticmethod
+    def _build_sources(results: List[Dict]) -> List[Dict]:
+        """Only include the highest scoring result in sources"""
+        top_result = results[0]  # Results are already sorted by score
+        return [
+            {
+                "page_number": top_result["metadata"]["page_number"],
+                "file_path": top_result["metadata"]["file_path"],
+                "score": top_result["metadata"]["score"],
+                "text_preview": top_result["processed_text"][:100] + "...",
+            }
+        ]
+
+    async def _embed_query(self, query: str) -> List[float]:
+        with timed_stage("embed"):
+            query_embeddings = await self.embeddings.get_embeddings([query])
+        return query_embeddings[0]
+
+    async def _retrieve(
+        self, query: str, file_id: str, query_embedding: Optional[Awaitable[List[float]]] = None
+    ) -> Tuple[Optional[Dict], List[Dict], Optional[List[float]]]:
+        """
+        Embed the query (or await `query_embedding`, already under way) and
+        search the document, going through the caches. Returns (cached
+        answer, results, query embedding); the embedding is None when an
+        exact cache hit made it unnecessary.
+        """
+        if self.answer_cache:
+            answer = self.answer_cache.get(file_id, query)
+            if answer is not None:
+                return answer, [], None
+
+        cache = self.retrieval_cache
+        if cache:
+            # An exact repeat skips both the embedding and the vector search
+            cached = cache.get(file_id, query)
+            if cached is not None:
+                return None, cached, None
+
+        # Generate query embedding
+        if query_embedding is None:
+            query_embedding = self._embed_query(query)
+        query_embeddings = [await query_embedding]
+
+        if self.answer_cache:
+            answer = self.answer_cache.get(file_id, query, query_embeddings[0])
+            if answer is not None:
+                return answer, [], query_embeddings[0]
+
+        if cache:
+            cached = cache.get_similar(file_id, query_embeddings[0])
+            if cached is not None:
+                return None, cached, query_embeddings[0]
 
-    async def get_response(self, query: str, file_id: str, db: Session) -> Dict:
+        with timed_stage("search"):
+            results = await within_deadline(
+                self.vector_store.similarity_search(
+                    query_embedding=query_embeddings[0],
+                    top_k=5,
+                    metadata_filter={"file_id": file_id},
+                    score_threshold=0.2,
+                    min_score_cutoff=0.3,
+                    query_text=query,
+                ),
+                "search",
+            )
+
+        if cache and results:
+            cache.put(file_id, query, query_embeddings[0], results)
+        return None, results, query_embeddings[0]
+
+    def _cache_answer(
+        self,
+        query: str,
+        file_id: str,
+        embedding: Optional[List[float]],
+        response: str,
+        sources: List[Dict],
+    ) -> Dict:
+        """Build the response dict, caching the answer when it is a real one"""
+        answer = {"response": response, "sources": sources, "cached": False}
+        if self.answer_cache and not self.llm.is_degraded_response(response):
+            answer["answer_key"] = self.answer_cache.put(
+                file_id, query, embedding, response, sources
+            )
+        return answer
+
+    async def get_response(
+        self,
+        query: str,
+        file_id: str,
+        db: Optional[AsyncSession],
+        user_id: Optional[int] = None,
+        query_embedding: Optional[Awaitable[List[float]]] = None,
+    ) -> Dict:
         """Get a response for a query about a specific PDF"""
         try:
             start_time = datetime.utcnow()
@@ -84,52 +321,109 @@ class ChatService:
                     query}' for file_id: {file_id}"
             )
 
-            # Generate query embedding
-            query_embeddings = await self.embeddings.get_embeddings([query])
+            with deadline_scope(self.request_deadline):
+                return await self._answer(
+                    query, file_id, user_id, start_time, query_embedding)
+
+        except Exception as e:
+            logger.error(f"Error in get_response: {str(e)}", exc_info=True)
+            raise
+
+    async def _answer(
+        self,
+        query: str,
+        file_id: str,
+        user_id: Optional[int],
+        start_time: datetime,
+        query_embedding: Optional[Awaitable[List[float]]] = None,
+    ) -> Dict:
+        # Retrieve relevant context
+        try:
+            cached_answer, results, embedding = await self._retrieve(
+                query, file_id, query_embedding)
+        except DeadlineExceeded as e:
+            logger.warning(f"Retrieval for file_id {file_id} ran out of time: {str(e)}")
+            return {"response": DEADLINE_RESPONSE, "sources": [], "cached": False}
+        if cached_answer is not None:
+            return cached_answer
 
-            # Retrieve relevant context
-            results = await self.vector_store.similarity_search(
-                query_embedding=query_embeddings[0],
-                top_k=5,
-                metadata_filter={"file_id": file_id},
-                score_threshold=0.2,
-                min_score_cutoff=0.3,
+        if not results:
+            logger.warning(
+                f"No relevant context found for query '{
+                    query}' in file {file_id}"
             )
+            return {"response": NO_CONTEXT_RESPONSE, "sources": [], "cached": False}
 
-            if not results:
-                logger.warning(
-                    f"No relevant context found for query '{
-                        query}' in file {file_id}"
-                )
-                return {
-                    "response": "I couldn't find any relevant information in the document to answer your question. "
-                    "Could you try rephrasing your question or being more specific?",
-                    "sources": [],
-                }
-
-            # Generate response using all relevant chunks
-            response = await self.llm.generate_response(query, results)
-
-            # Only include the highest scoring result in sources
-            top_result = results[0]  # Results are already sorted by score
-            sources = [
-                {
-                    "page_number": top_result["metadata"]["page_number"],
-                    "file_path": top_result["metadata"]["file_path"],
-                    "score": top_result["metadata"]["score"],
-                    "text_preview": top_result["processed_text"][:100] + "...",
-                }
-            ]
-
-            end_time = datetime.utcnow()
-            logger.info(
-                f"[{end_time}] Completed response generation. "
-                f"Processing time: {
-                    (end_time - start_time).total_seconds():.2f}s"
+        # Generate response using all relevant chunks
+        with timed_stage("generate"):
+            response = await self.llm.generate_response(query, results, user_id)
+        sources = self._build_sources(results)
+
+        end_time = datetime.utcnow()
+        logger.info(
+            f"[{end_time}] Completed response generation. "
+            f"Processing time: {
+                (end_time - start_time).total_seconds():.2f}s"
+        )
+
+        return self._cache_answer(query, file_id, embedding, response, sources)
+
+    async def stream_response(
+        self, query: str, file_id: str, user_id: Optional[int] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Stream a response as {"type": "token", "content"} events followed by
+        one {"type": "done", "response", "sources", "cached"} event
+        """
+        start_time = datetime.utcnow()
+        logger.info(
+            f"[{start_time}] Streaming query: '{query}' for file_id: {file_id}"
+        )
+
+        with deadline_scope(self.request_deadline), stage_timer("chat_stream") as timer:
+            async for event in self._stream_answer(query, file_id, user_id, start_time):
+                yield event
+            timer.report()
+
+    async def _stream_answer(
+        self, query: str, file_id: str, user_id: Optional[int], start_time: datetime
+    ) -> AsyncGenerator[Dict, None]:
+        try:
+            cached_answer, results, embedding = await self._retrieve(query, file_id)
+        except DeadlineExceeded as e:
+            logger.warning(f"Retrieval for file_id {file_id} ran out of time: {str(e)}")
+            cached_answer = {"response": DEADLINE_RESPONSE, "sources": [], "cached": False}
+        if cached_answer is not None:
+            yield {"type": "token", "content": cached_answer["response"]}
+            yield {"type": "done", **cached_answer}
+            return
+
+        if not results:
+            logger.warning(
+                f"No relevant context found for query '{
+                    query}' in file {file_id}"
             )
+            yield {"type": "token", "content": NO_CONTEXT_RESPONSE}
+            yield {
+                "type": "done",
+                "response": NO_CONTEXT_RESPONSE,
+                "sources": [],
+                "cached": False,
+            }
+            return
 
-            return {"response": response, "sources": sources}
+        tokens = []
+        with timed_stage("generate"):
+            async for token in self.llm.stream_response(query, results, user_id):
+                tokens.append(token)
+                yield {"type": "token", "content": token}
 
-        except Exception as e:
-            logger.error(f"Error in get_response: {str(e)}", exc_info=True)
-            raise
+        end_time = datetime.utcnow()
+        logger.info(
+            f"[{end_time}] Completed streamed response. "
+            f"Processing time: {(end_time - start_time).total_seconds():.2f}s"
+        )
+        answer = self._cache_answer(
+            query, file_id, embedding, "".join(tokens), self._build_sources(results)
+        )
+        yield {"type": "done", **answer}
@@ -2,16 +2,19 @@ import asyncio
 import os
 import uuid
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
 
 from app.core.websocket_manager import WebSocketManager
+from app.db.utils import get_async_db_session
 from app.models.domain.pdf import PDF
+from app.repositories.pdf_repository import PDFRepository
+from app.services.answer_cache import AnswerCache
 from app.services.rag_pipeline.document_processor import DocumentProcessor
 from app.services.rag_pipeline.embeddings import OllamaEmbeddings
-from app.services.rag_pipeline.vector_store import PineconeStore
+from app.services.rag_pipeline.vector_store import VectorStore
+from app.services.retrieval_cache import RetrievalCache
 from app.utils.logging import get_service_logger
 
 logger = get_service_logger("pdf_service")
@@ -23,15 +26,26 @@ class PDFService:
         self,
         document_processor: DocumentProcessor,
         embeddings: OllamaEmbeddings,
-        vector_store: PineconeStore,
+        vector_store: VectorStore,
         upload_dir: str,
         websocket_manager: WebSocketManager,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        answer_cache: Optional[AnswerCache] = None,
     ):
         self.document_processor = document_processor
         self.embeddings = embeddings
         self.vector_store = vector_store
         self.upload_dir = upload_dir
         self.websocket_manager = websocket_manager
+        self.retrieval_cache = retrieval_cache
+        self.answer_cache = answer_cache
+
+    def invalidate_document_caches(self, file_id: str):
+        """Forget cached retrievals and answers once a document's chunks change"""
+        if self.retrieval_cache:
+            self.retrieval_cache.invalidate(file_id)
+        if self.answer_cache:
+            self.answer_cache.invalidate(file_id)
 
     async def process_chunk_batch(
         self,
@@ -92,13 +106,26 @@ class PDFService:
         filename: str,
         content: bytes,
         user_id: int,
-        db: Session
+        replace_existing: bool = False
     ) -> PDF:
         start_time = datetime.utcnow()
         logger.info(
             f"[{start_time}] Starting PDF processing for user {user_id}")
 
         try:
+            # Anything cached for this document is stale once re-ingestion starts
+            self.invalidate_document_caches(file_id)
+            # Re-ingestion replaces the chunks stored before instead of adding
+            # to them. New uploads get a fresh file_id and have none.
+            if replace_existing:
+                try:
+                    await self.vector_store.delete_document(file_id)
+                except Exception as e:
+                    logger.warning(
+                        f"Could not delete stored chunks of file_id {file_id} "
+                        f"before re-ingesting it: {str(e)}"
+                    )
+
             # Initial progress update
             await self.websocket_manager.send_progress(file_id, user_id, {
                 "progress": 0,
@@ -184,16 +211,17 @@ class PDFService:
                     "status": "Finalizing processing..."
                 })
 
-                pdf_db = PDF(
-                    file_id=file_id,
-                    filename=filename,
-                    file_path=file_path,
-                    user_id=user_id,
-                    is_processed=True
-                )
-                db.add(pdf_db)
-                db.commit()
-                db.refresh(pdf_db)
+                # The request's session is gone by the time this task runs
+                async with get_async_db_session() as db:
+                    pdf_db = await PDFRepository.create_pdf(
+                        db,
+                        file_id=file_id,
+                        filename=filename,
+                        file_path=file_path,
+                        user_id=user_id,
+                        is_processed=True
+                    )
+                self.invalidate_document_caches(file_id)
 
                 end_time = datetime.utcnow()
                 processing_time = (end_time - start_time).total_seconds()
@@ -223,6 +251,7 @@ class PDFService:
 
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}", exc_info=True)
+            self.invalidate_document_caches(file_id)
             if os.path.exists(file_path):
                 os.remove(file_path)
             await ws_manager.send_progress(file_id, user_id, {
@@ -0,0 +1,132 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.utils.logging import get_service_logger
+
+logger = get_service_logger("query_cache")
+
+CacheKey = Tuple[str, str]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+@dataclass
+class QueryCacheEntry:
+    embedding: Optional[np.ndarray]
+    expires_at: float
+
+
+class QueryCache:
+    """
+    TTL + LRU bookkeeping shared by the caches keyed on (file_id, normalized
+    query). Entries are indexed per document, so a document's entries can be
+    invalidated together and searched by query embedding. Subclasses decide
+    what an entry holds and when the cache is full.
+    """
+
+    # What the entries are, for log messages
+    entry_name = "entries"
+
+    def __init__(self, ttl_seconds: float, similarity_threshold: Optional[float]):
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[CacheKey, QueryCacheEntry]" = OrderedDict()
+        self._keys_by_file: Dict[str, Set[CacheKey]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_id: str, query: str) -> CacheKey:
+        return file_id, normalize_query(query)
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        # Failed embeddings come back as zero vectors, never match on those
+        return vector / norm if norm > 0 else None
+
+    def _is_full(self) -> bool:
+        return False
+
+    def _removed(self, key: CacheKey, entry: QueryCacheEntry):
+        """Called with every entry that leaves the cache"""
+
+    def _remove(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        file_keys = self._keys_by_file.get(key[0])
+        if file_keys is not None:
+            file_keys.discard(key)
+            if not file_keys:
+                del self._keys_by_file[key[0]]
+        self._removed(key, entry)
+
+    def _insert(self, key: CacheKey, entry: QueryCacheEntry):
+        """Store an entry, then evict the least recently used while full"""
+        self._remove(key)
+        self._entries[key] = entry
+        self._keys_by_file.setdefault(key[0], set()).add(key)
+        while self._entries and self._is_full():
+            self._remove(next(iter(self._entries)))
+
+    def _expires_at(self) -> float:
+        return time.monotonic() + self.ttl_seconds
+
+    def _touch(self, key: CacheKey):
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+    def _lookup(self, key: CacheKey) -> Optional[QueryCacheEntry]:
+        """Unexpired entry of a key, expired ones are dropped"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _lookup_similar(
+        self, file_id: str, embedding: List[float]
+    ) -> Optional[Tuple[CacheKey, QueryCacheEntry, float]]:
+        """
+        (key, entry, similarity) of the document's entry whose query
+        embedding is closest to `embedding`, if within the threshold
+        """
+        query_vector = self._unit(embedding)
+        now = time.monotonic()
+        candidates = []
+        for key in list(self._keys_by_file.get(file_id, ())):
+            entry = self._entries[key]
+            if entry.expires_at < now:
+                self._remove(key)
+            elif entry.embedding is not None:
+                candidates.append((key, entry))
+
+        if query_vector is None or not candidates:
+            return None
+        similarities = np.stack([entry.embedding for _, entry in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return (*candidates[best], float(similarities[best]))
+
+    def invalidate(self, file_id: str):
+        """Drop every cached entry of a document"""
+        keys = list(self._keys_by_file.get(file_id, ()))
+        for key in keys:
+            self._remove(key)
+        if keys:
+            logger.info(
+                f"Invalidated {len(keys)} cached {self.entry_name} for file_id: {file_id}"
+            )
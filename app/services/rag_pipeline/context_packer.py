@@ -0,0 +1,86 @@
+import math
+import re
+from typing import Dict, List
+
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("context_packer")
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s|\n")
+
+
+class ContextPacker:
+    """
+    Fits retrieved chunks into a token budget so nothing sent to Ollama is
+    silently cut off by num_ctx. Chunks are taken in score order, the first
+    one that does not fit is trimmed at a sentence boundary, the rest dropped.
+
+    Token counts are estimated from character length; the model tokenizer
+    is not available client side, so the ratio should err on the low side.
+    """
+
+    def __init__(self, chars_per_token: float = 3.5, min_trim_tokens: int = 64):
+        self.chars_per_token = chars_per_token
+        self.min_trim_tokens = min_trim_tokens
+
+    def estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    @staticmethod
+    def format_chunk(doc: Dict) -> str:
+        return f"[Page {doc['metadata']['page_number']}]: {doc['text']}"
+
+    @staticmethod
+    def _trim_to_sentence(text: str, max_chars: int) -> str:
+        """Cut text to at most max_chars, ending on a sentence if possible"""
+        head = text[:max_chars]
+        ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+        if ends and ends[-1] > max_chars // 2:
+            return head[: ends[-1]].rstrip()
+        # No usable sentence end, fall back to the last word boundary
+        cut = head.rfind(" ")
+        return (head[:cut] if cut > 0 else head).rstrip()
+
+    def pack(self, context: List[Dict], token_budget: int) -> List[Dict]:
+        """Return the chunks (copies, possibly trimmed) that fit the budget"""
+        ranked = sorted(context, key=lambda x: x["metadata"]["score"], reverse=True)
+        separator_tokens = self.estimate_tokens("\n\n")
+        remaining = token_budget
+        packed = []
+
+        for position, doc in enumerate(ranked):
+            tokens = self.estimate_tokens(self.format_chunk(doc)) + separator_tokens
+            if tokens <= remaining:
+                packed.append(doc)
+                remaining -= tokens
+                continue
+
+            # Header and separator stay, only the chunk text is shortened
+            overhead = tokens - self.estimate_tokens(doc["text"])
+            if remaining - overhead >= self.min_trim_tokens:
+                max_chars = int((remaining - overhead) * self.chars_per_token)
+                trimmed_text = self._trim_to_sentence(doc["text"], max_chars)
+                if trimmed_text:
+                    packed.append({**doc, "text": trimmed_text})
+                    remaining -= self.estimate_tokens(trimmed_text) + overhead
+                    logger.info(
+                        f"Trimmed chunk from page {doc['metadata']['page_number']} "
+                        f"to {len(trimmed_text)} of {len(doc['text'])} characters"
+                    )
+                    position += 1
+
+            # Lower scored chunks never jump ahead of one that did not fit
+            for dropped in ranked[position:]:
+                logger.info(
+                    f"Dropped chunk from page {dropped['metadata']['page_number']} "
+                    f"(score={dropped['metadata']['score']:.4f}) over the "
+                    f"{token_budget} token context budget"
+                )
+            break
+
+        logger.debug(
+            f"Packed {len(packed)}/{len(context)} chunks into "
+            f"{token_budget - remaining}/{token_budget} estimated tokens"
+        )
+        return packed
@@ -1,9 +1,14 @@
 import asyncio
-from typing import List
+import time
+from typing import List, Optional
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.core.deadline import (DeadlineExceeded, current_deadline, hedged,
+                               stage_timeout, stop_when_out_of_budget,
+                               within_deadline)
+from app.services.rag_pipeline.ollama_pool import OllamaHostPool
 from app.utils.logging import get_pipeline_logger
 
 logger = get_pipeline_logger("embeddings")
@@ -16,27 +21,62 @@ class OllamaEmbeddings:
         model_name: str,
         batch_size: int = 2,
         request_timeout: int = 30,
+        hedge_delay: Optional[float] = 1.0,
+        host_pool: Optional[OllamaHostPool] = None,
+        keep_alive: Optional[str] = None,
     ):
         self.base_url = base_url
+        # Embedding hosts, base_url alone unless a pool is configured
+        self.hosts = host_pool or OllamaHostPool([base_url], role="embed")
+        self.keep_alive = keep_alive
+        # Read by the model warmer to keep the model loaded while in use
+        self.last_used_at: Optional[float] = None
         self.model_name = model_name
         self.batch_size = batch_size
         self.request_timeout = request_timeout
+        # A slow request is raced on another host of the pool, None disables
+        self.hedge_delay = hedge_delay
         self.semaphore = asyncio.Semaphore(2)  # Limit concurrent requests
 
+    async def _post_embedding(self, base_url: str, text: str) -> List[float]:
+        # Each attempt gets what is left of the request deadline, if any
+        async with httpx.AsyncClient(timeout=stage_timeout(self.request_timeout)) as client:
+            body = {"model": self.model_name, "prompt": text}
+            if self.keep_alive is not None:
+                body["keep_alive"] = self.keep_alive
+            response = await client.post(f"{base_url}/api/embeddings", json=body)
+            response.raise_for_status()
+            return response.json()["embedding"]
+
+    async def _embed_on_pool(self, text: str, hosts_in_use: List[str]) -> List[float]:
+        # A hedged request goes to a different host than the first one
+        async with self.hosts.request(exclude=hosts_in_use) as base_url:
+            hosts_in_use.append(base_url)
+            return await self._post_embedding(base_url, text)
+
     @retry(
-        stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
+        stop=stop_after_attempt(3) | stop_when_out_of_budget(min_attempt_seconds=1.0),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        reraise=True,
     )
     async def _get_single_embedding(self, text: str) -> List[float]:
         """Get embedding for a single text with retry logic"""
+        # Waiting for a free slot also counts against the deadline
         async with self.semaphore:  # Limit concurrent requests
+            hosts_in_use: List[str] = []
             try:
-                async with httpx.AsyncClient(timeout=self.request_timeout) as client:
-                    response = await client.post(
-                        f"{self.base_url}/api/embeddings",
-                        json={"model": self.model_name, "prompt": text},
-                    )
-                    response.raise_for_status()
-                    return response.json()["embedding"]
+                # Only chat queries, which run under a deadline, are hedged
+                return await hedged(
+                    lambda: self._embed_on_pool(text, hosts_in_use),
+                    (
+                        (lambda: self._embed_on_pool(text, hosts_in_use))
+                        if self.hedge_delay is not None
+                        and len(self.hosts.urls) > 1
+                        and current_deadline() is not None
+                        else None
+                    ),
+                    self.hedge_delay,
+                )
             except Exception as e:
                 logger.error(f"Error generating embedding: {str(e)}")
                 raise
@@ -44,6 +84,7 @@ class OllamaEmbeddings:
     async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get embeddings for multiple texts in smaller batches"""
         logger.info(f"Generating embeddings for {len(texts)} texts")
+        self.last_used_at = time.monotonic()
         all_embeddings = []
 
         # Process in smaller batches
@@ -57,10 +98,14 @@ class OllamaEmbeddings:
             # Process batch concurrently but with rate limiting
             try:
                 tasks = [self._get_single_embedding(text) for text in batch]
-                batch_embeddings = await asyncio.gather(*tasks, return_exceptions=True)
+                batch_embeddings = await within_deadline(
+                    asyncio.gather(*tasks, return_exceptions=True), "embedding"
+                )
 
                 # Handle any exceptions in the batch
                 for j, embedding in enumerate(batch_embeddings):
+                    if isinstance(embedding, DeadlineExceeded):
+                        raise embedding
                     if isinstance(embedding, Exception):
                         logger.error(
                             f"Error in batch {
@@ -71,9 +116,12 @@ class OllamaEmbeddings:
                     else:
                         all_embeddings.append(embedding)
 
-                # Add delay between batches
-                await asyncio.sleep(1)
+                # Add delay between batches, none after the last one
+                if i + self.batch_size < len(texts):
+                    await asyncio.sleep(1)
 
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.error(f"Error processing batch: {str(e)}")
                 # Fill failed batch with zero vectors
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("keyword_index")
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """Fuse several ranked id lists into one score per id (RRF)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+class KeywordIndex:
+    """Local SQLite FTS5 index over chunk text for BM25 retrieval"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        logger.info(f"KeywordIndex configured at: {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    text,
+                    processed_text,
+                    chunk_id UNINDEXED,
+                    file_id UNINDEXED,
+                    file_path UNINDEXED,
+                    page_number UNINDEXED,
+                    tokenize = 'unicode61'
+                )
+                """
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _build_match_query(query: str, processed_query: str) -> str:
+        """OR together raw terms (keeps digits and codes) and lemmatized terms"""
+        terms = re.findall(r"\w+", query.lower()) + processed_query.split()
+        unique_terms = dict.fromkeys(term for term in terms if term)
+        return " OR ".join(f'"{term}"' for term in unique_terms)
+
+    def _add_documents(self, rows: List[Dict]):
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO chunks_fts "
+                "(text, processed_text, chunk_id, file_id, file_path, page_number) "
+                "VALUES (:text, :processed_text, :chunk_id, :file_id, :file_path, :page_number)",
+                rows,
+            )
+            conn.commit()
+
+    def _search(
+        self, query: str, processed_query: str, file_id: str, limit: int
+    ) -> List[Dict]:
+        match_query = self._build_match_query(query, processed_query)
+        if not match_query:
+            return []
+
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT chunk_id, text, processed_text, file_id, file_path, page_number, "
+                "bm25(chunks_fts) AS rank "
+                "FROM chunks_fts WHERE chunks_fts MATCH ? AND file_id = ? "
+                "ORDER BY rank LIMIT ?",
+                (match_query, file_id, limit),
+            ).fetchall()
+
+        return [
+            {
+                "chunk_id": row[0],
+                "text": row[1],
+                "processed_text": row[2],
+                "file_id": row[3],
+                "file_path": row[4],
+                "page_number": int(row[5]),
+                # bm25() is lower-is-better, flip it so higher means more relevant
+                "bm25_score": -float(row[6]),
+            }
+            for row in rows
+        ]
+
+    def _delete_document(self, file_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM chunks_fts WHERE file_id = ?", (file_id,))
+            conn.commit()
+
+    async def add_documents(self, rows: List[Dict]):
+        """Index chunk rows (text, processed_text, chunk_id, file_id, file_path, page_number)"""
+        if not rows:
+            return
+        await asyncio.to_thread(self._add_documents, rows)
+        logger.info(f"Indexed {len(rows)} chunks for keyword search")
+
+    async def search(
+        self, query: str, processed_query: str, file_id: str, limit: int = 10
+    ) -> List[Dict]:
+        """BM25 search restricted to a single document"""
+        try:
+            hits = await asyncio.to_thread(
+                self._search, query, processed_query, file_id, limit
+            )
+            logger.info(f"Keyword search returned {len(hits)} hits")
+            return hits
+        except Exception as e:
+            logger.error(f"Error during keyword search: {str(e)}")
+            return []
+
+    async def delete_document(self, file_id: str):
+        """Remove every indexed chunk of a document"""
+        await asyncio.to_thread(self._delete_document, file_id)
+        logger.info(f"Removed keyword index entries for file_id: {file_id}")
@@ -1,69 +1,174 @@
+import json
 import time
-from typing import Dict, List
+from contextlib import nullcontext
+from typing import AsyncGenerator, Dict, Hashable, List, Optional
 
 import httpx
 from tenacity import (retry, retry_if_exception_type, stop_after_attempt,
                       wait_exponential)
 
+from app.core.deadline import (DeadlineExceeded, current_deadline, hedged,
+                               stage_timeout, stop_when_out_of_budget)
+from app.core.metrics import metrics
+from app.services.rag_pipeline.context_packer import ContextPacker
+from app.services.rag_pipeline.llm_scheduler import LLMScheduler, QueueTimeout
+from app.services.rag_pipeline.ollama_pool import OllamaHostPool
+from app.services.rag_pipeline.prompt_sessions import PromptSessions
 from app.utils.logging import get_pipeline_logger
 
 logger = get_pipeline_logger("llm")
 
+ERROR_RESPONSE = (
+    "I apologize, but I encountered an error while trying to generate a response. "
+    "Please try again or rephrase your question."
+)
+FALLBACK_RESPONSE = (
+    "I found some potentially relevant information but am having trouble processing it. "
+    "Please try your question again, or try asking in a different way."
+)
+FALLBACK_EXCERPT_PREFIX = "While I'm having trouble generating a complete response"
+
+
+def record_model_load(model_name: str, result: Dict) -> Optional[float]:
+    """Record Ollama's load_duration (ns) of a response, returns seconds"""
+    load_duration = result.get("load_duration")
+    if load_duration is None:
+        return None
+    load_seconds = load_duration / 1e9
+    metrics.histogram("ollama_model_load_seconds").observe(load_seconds)
+    # Anything beyond a fraction of a second means the model was not resident
+    if load_seconds > 0.5:
+        metrics.counter("ollama_cold_loads_total").inc()
+        logger.info(f"Ollama loaded {model_name} in {load_seconds:.2f}s")
+    return load_seconds
+
 
 class OllamaLLM:
-    def __init__(self, base_url: str, model_name: str):
+    def __init__(
+        self,
+        base_url: str,
+        model_name: str,
+        num_ctx: int = 4096,
+        answer_token_reserve: int = 512,
+        context_token_budget: Optional[int] = None,
+        chars_per_token: float = 3.5,
+        scheduler: Optional[LLMScheduler] = None,
+        keep_alive: Optional[str] = "30m",
+        hedge_delay: Optional[float] = 10.0,
+        host_pool: Optional[OllamaHostPool] = None,
+    ):
         self.base_url = base_url
+        # Generation hosts, base_url alone unless a pool is configured
+        self.hosts = host_pool or OllamaHostPool([base_url], role="generate")
+        # Read by the model warmer to keep the model loaded while in use
+        self.last_used_at: Optional[float] = None
         self.model_name = model_name
         self.timeout = 1200  # Increased timeout to 60 seconds
-        logger.info(f"Initialized OllamaLLM with model: {model_name}")
+        self.num_ctx = num_ctx
+        # Room left in num_ctx for the generated answer
+        self.answer_token_reserve = answer_token_reserve
+        self.context_token_budget = context_token_budget
+        self.context_packer = ContextPacker(chars_per_token=chars_per_token)
+        self.scheduler = scheduler
+        # Keep the model, and with it the KV cache of the last prompt, loaded
+        self.keep_alive = keep_alive
+        # A slow request is raced on another host of the pool, None disables
+        self.hedge_delay = hedge_delay
+        self.prompt_sessions = PromptSessions(self.context_packer)
+        logger.info(
+            f"Initialized OllamaLLM with model: {model_name}, num_ctx={num_ctx}"
+        )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type(httpx.ReadTimeout),
-    )
-    async def _make_llm_request(self, prompt: str) -> str:
-        """Make request to Ollama with retry logic"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+    def _request_body(self, prompt: str, stream: bool) -> Dict:
+        body = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "num_ctx": self.num_ctx,
+            },
+        }
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        return body
+
+    def _record_result(self, result: Dict, prompt: str):
+        """Metrics of a finished generation: model load and prompt evaluation"""
+        record_model_load(self.model_name, result)
+        self._record_prompt_eval(result, prompt)
+
+    def _record_prompt_eval(self, result: Dict, prompt: str):
+        """
+        Log how much of the prompt Ollama actually evaluated. Tokens served
+        from the KV cache of the previous prompt are not counted in
+        prompt_eval_count, so the gap to the prompt size is the reuse.
+        """
+        evaluated = result.get("prompt_eval_count")
+        duration_ns = result.get("prompt_eval_duration")
+        if not evaluated or duration_ns is None:
+            return
+
+        eval_seconds = duration_ns / 1e9
+        prompt_tokens = self.context_packer.estimate_tokens(prompt)
+        reused = max(prompt_tokens - evaluated, 0)
+        saved_seconds = reused * eval_seconds / evaluated
+        metrics.histogram("llm_prompt_eval_seconds").observe(eval_seconds)
+        metrics.counter("llm_prompt_tokens_evaluated_total").inc(evaluated)
+        metrics.histogram("llm_prompt_eval_saved_seconds").observe(saved_seconds)
+        logger.info(
+            f"Prompt eval: {evaluated} tokens in {eval_seconds:.2f}s, "
+            f"~{reused} of ~{prompt_tokens} reused from cache "
+            f"(~{saved_seconds:.2f}s saved)"
+        )
+
+    async def _post_generate(self, base_url: str, prompt: str) -> Dict:
+        # Each attempt gets what is left of the request deadline, if any
+        async with httpx.AsyncClient(timeout=stage_timeout(self.timeout)) as client:
             logger.debug(f"Sending request to Ollama API: {
-                         self.base_url}/api/generate")
+                         base_url}/api/generate")
             response = await client.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "num_ctx": 4096,  # Increase context window
-                    },
-                },
+                f"{base_url}/api/generate",
+                json=self._request_body(prompt, stream=False),
             )
             response.raise_for_status()
-            return response.json()["response"]
+            return response.json()
 
-    async def generate_response(self, query: str, context: List[Dict]) -> str:
-        """Generate a response using the LLM"""
-        start_time = time.time()
-        logger.info(f"Generating response for query: {query}")
-        logger.debug(f"Context contains {len(context)} documents")
+    async def _generate_on_pool(self, prompt: str, hosts_in_use: List[str]) -> Dict:
+        # A hedged request goes to a different host than the first one
+        async with self.hosts.request(exclude=hosts_in_use) as base_url:
+            hosts_in_use.append(base_url)
+            return await self._post_generate(base_url, prompt)
 
-        try:
-            # Format context more concisely
-            context_text = "\n\n".join(
-                [
-                    f"[Page {doc['metadata']['page_number']}]: {doc['text']}"
-                    for doc in sorted(
-                        context, key=lambda x: x["metadata"]["score"], reverse=True
-                    )
-                ]
-            )
-            logger.debug(f"Formatted context length: {
-                         len(context_text)} characters")
+    @retry(
+        # Only retry while the deadline leaves room for another attempt
+        stop=stop_after_attempt(3) | stop_when_out_of_budget(min_attempt_seconds=5.0),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(httpx.ReadTimeout),
+        reraise=True,
+    )
+    async def _make_llm_request(self, prompt: str) -> Dict:
+        """Make request to Ollama with retry logic, returns the full result"""
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("generation")
+        hosts_in_use: List[str] = []
+        return await hedged(
+            lambda: self._generate_on_pool(prompt, hosts_in_use),
+            (
+                (lambda: self._generate_on_pool(prompt, hosts_in_use))
+                if self.hedge_delay is not None and len(self.hosts.urls) > 1
+                else None
+            ),
+            self.hedge_delay,
+        )
 
-            # Create a more focused prompt
-            prompt = f"""You are a helpful assistant answering questions about a document. Use the following context to answer the question.
+    @staticmethod
+    def _format_prompt(query: str, context_text: str) -> str:
+        # Instructions and context come first and the question last, so that
+        # the prompt only changes at its end between turns on one document
+        return f"""You are a helpful assistant answering questions about a document. Use the following context to answer the question.
             If the answer is not in the context, say "I cannot find information about that in the document."
 
             Context:
@@ -73,36 +178,160 @@ class OllamaLLM:
 
             Answer (be concise and specific):"""
 
-            logger.debug(f"Generated prompt with length: {
-                         len(prompt)} characters")
+    def _context_budget(self, query: str) -> int:
+        """Tokens left for context once the template, query and answer fit"""
+        available = (
+            self.num_ctx
+            - self.answer_token_reserve
+            - self.context_packer.estimate_tokens(self._format_prompt(query, ""))
+        )
+        if self.context_token_budget is not None:
+            available = min(available, self.context_token_budget)
+        return max(available, 0)
+
+    def _build_prompt(
+        self, query: str, context: List[Dict], user_id: Optional[Hashable] = None
+    ) -> str:
+        # Only send what fits num_ctx, Ollama would silently truncate the rest
+        budget = self._context_budget(query)
+        file_id = context[0]["metadata"].get("file_id") if context else None
+        if user_id is not None and file_id is not None:
+            # Keep earlier turns' chunks in place so the prefix is reused
+            packed = self.prompt_sessions.arrange((user_id, file_id), context, budget)
+        else:
+            packed = self.context_packer.pack(context, budget)
+        context_text = "\n\n".join(
+            [self.context_packer.format_chunk(doc) for doc in packed]
+        )
+        logger.debug(f"Formatted context length: {
+                     len(context_text)} characters")
+
+        # Create a more focused prompt
+        prompt = self._format_prompt(query, context_text)
+
+        logger.debug(f"Generated prompt with length: {
+                     len(prompt)} characters")
+        return prompt
+
+    @staticmethod
+    def _fallback_response(context: List[Dict]) -> str:
+        """Answer with the most relevant excerpt when generation times out"""
+        most_relevant = context[0] if context else None
+        if most_relevant and most_relevant["metadata"]["score"] > 0.2:
+            return (
+                f"{FALLBACK_EXCERPT_PREFIX}, "
+                f"I found relevant information on page {
+                    most_relevant['metadata']['page_number']}. "
+                f"Here's the relevant excerpt:\n\n{
+                    most_relevant['text']}"
+            )
+        return FALLBACK_RESPONSE
+
+    @staticmethod
+    def is_degraded_response(response: str) -> bool:
+        """True for the error and timeout fallback texts, which are not real answers"""
+        return (
+            response in (ERROR_RESPONSE, FALLBACK_RESPONSE)
+            or response.startswith(FALLBACK_EXCERPT_PREFIX)
+        )
+
+    def _generation_slot(self, user_id: Optional[Hashable]):
+        """Wait for the scheduler to admit this generation, if there is one"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(user_id)
+
+    async def generate_response(
+        self, query: str, context: List[Dict], user_id: Optional[Hashable] = None
+    ) -> str:
+        """Generate a response using the LLM"""
+        start_time = time.time()
+        self.last_used_at = time.monotonic()
+        logger.info(f"Generating response for query: {query}")
+        logger.debug(f"Context contains {len(context)} documents")
+
+        try:
+            prompt = self._build_prompt(query, context, user_id)
 
             # Try to get response with retries
             try:
-                response = await self._make_llm_request(prompt)
+                async with self._generation_slot(user_id):
+                    result = await self._make_llm_request(prompt)
+                self._record_result(result, prompt)
+                response = result["response"]
                 processing_time = time.time() - start_time
                 logger.info(f"Generated response in {
                             processing_time:.2f} seconds")
                 return response
+            except (QueueTimeout, DeadlineExceeded) as e:
+                # Overloaded or out of time, answer from the best excerpt
+                logger.warning(f"Answering with excerpt: {str(e)}")
+                return self._fallback_response(context)
             except httpx.ReadTimeout:
                 logger.warning("All retry attempts failed due to timeout")
                 # Fall back to summarizing the most relevant context
-                most_relevant = context[0] if context else None
-                if most_relevant and most_relevant["metadata"]["score"] > 0.2:
-                    return (
-                        f"While I'm having trouble generating a complete response, "
-                        f"I found relevant information on page {
-                            most_relevant['metadata']['page_number']}. "
-                        f"Here's the relevant excerpt:\n\n{
-                            most_relevant['text']}"
-                    )
-                return (
-                    "I found some potentially relevant information but am having trouble processing it. "
-                    "Please try your question again, or try asking in a different way."
-                )
+                return self._fallback_response(context)
 
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}", exc_info=True)
-            return (
-                "I apologize, but I encountered an error while trying to generate a response. "
-                "Please try again or rephrase your question."
-            )
+            return ERROR_RESPONSE
+
+    async def stream_response(
+        self, query: str, context: List[Dict], user_id: Optional[Hashable] = None
+    ) -> AsyncGenerator[str, None]:
+        """Generate a response token by token from Ollama's NDJSON stream"""
+        start_time = time.time()
+        self.last_used_at = time.monotonic()
+        first_token_time = None
+        deadline = current_deadline()
+        logger.info(f"Streaming response for query: {query}")
+
+        try:
+            prompt = self._build_prompt(query, context, user_id)
+            async with self._generation_slot(user_id), self.hosts.request() as base_url:
+                async with httpx.AsyncClient(
+                    timeout=stage_timeout(self.timeout)
+                ) as client, client.stream(
+                    "POST",
+                    f"{base_url}/api/generate",
+                    json=self._request_body(prompt, stream=True),
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        # The read timeout only bounds the gap between chunks
+                        if deadline is not None:
+                            deadline.check("streaming")
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        token = chunk.get("response", "")
+                        if token:
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                logger.info(f"First token after {
+                                            first_token_time - start_time:.2f} seconds")
+                            yield token
+                        if chunk.get("done"):
+                            self._record_result(chunk, prompt)
+                            break
+
+            logger.info(f"Streamed response in {
+                        time.time() - start_time:.2f} seconds")
+
+        except (QueueTimeout, DeadlineExceeded) as e:
+            if first_token_time is not None:
+                logger.warning(f"Stopped streaming: {str(e)}")
+                raise
+            logger.warning(f"Answering with excerpt: {str(e)}")
+            yield self._fallback_response(context)
+        except httpx.ReadTimeout:
+            logger.warning("Streaming request timed out")
+            if first_token_time is not None:
+                # A cut-off answer must not pass for a complete one
+                raise
+            yield self._fallback_response(context)
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+            if first_token_time is not None:
+                raise
+            yield ERROR_RESPONSE
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Hashable, Optional
+
+from app.core.deadline import stage_timeout
+from app.core.metrics import metrics
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("llm_scheduler")
+
+
+class QueueTimeout(Exception):
+    """Raised when a generation waited longer than the scheduler allows"""
+
+
+class LLMScheduler:
+    """
+    Admission control in front of Ollama. At most `max_concurrent`
+    generations run at once; waiting requests are queued per user and freed
+    slots go round-robin across users, so one user with many questions
+    cannot starve the others. A request that waits longer than
+    `max_queue_wait` is refused with QueueTimeout.
+    """
+
+    def __init__(self, max_concurrent: int = 1, max_queue_wait: Optional[float] = 30.0):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.max_queue_wait = max_queue_wait
+        self._active = 0
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._queue_depth = metrics.gauge("llm_queue_depth")
+        self._active_gauge = metrics.gauge("llm_active_generations")
+        self._wait_seconds = metrics.histogram("llm_queue_wait_seconds")
+        self._timeouts = metrics.counter("llm_queue_timeouts_total")
+        logger.info(
+            f"LLMScheduler initialized with max_concurrent={max_concurrent}, "
+            f"max_queue_wait={max_queue_wait}s"
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _update_gauges(self):
+        self._queue_depth.set(self.queue_depth)
+        self._active_gauge.set(self._active)
+
+    def _dispatch(self):
+        """Hand free slots to waiters, one user at a time in turn"""
+        while self._active < self.max_concurrent and self._queues:
+            user_key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+            if waiter.done():
+                continue
+            self._active += 1
+            waiter.set_result(None)
+        self._update_gauges()
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _withdraw(self, user_key: Hashable, waiter: asyncio.Future):
+        queue = self._queues.get(user_key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user_key]
+        self._update_gauges()
+
+    async def _acquire(self, user_key: Hashable):
+        if self._active < self.max_concurrent and not self._queues:
+            self._active += 1
+            self._update_gauges()
+            self._wait_seconds.observe(0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_key, deque()).append(waiter)
+        self._update_gauges()
+        start_time = time.perf_counter()
+        try:
+            # Never wait past the request deadline either
+            await asyncio.wait_for(
+                asyncio.shield(waiter), stage_timeout(self.max_queue_wait)
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the wait ended, hand the slot on
+                self._release()
+            else:
+                waiter.cancel()
+                self._withdraw(user_key, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._timeouts.inc()
+                logger.warning(
+                    f"Generation for {user_key} gave up after waiting "
+                    f"{time.perf_counter() - start_time:.2f}s in the LLM queue"
+                )
+                raise QueueTimeout(
+                    f"Waited {time.perf_counter() - start_time:.2f}s for a "
+                    f"generation slot"
+                )
+            raise
+        finally:
+            self._wait_seconds.observe(time.perf_counter() - start_time)
+
+    @asynccontextmanager
+    async def slot(self, user_key: Hashable = None) -> AsyncIterator[None]:
+        """Hold one generation slot for the duration of the block"""
+        await self._acquire(user_key)
+        try:
+            yield
+        finally:
+            self._release()
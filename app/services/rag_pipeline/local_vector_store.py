@@ -0,0 +1,392 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.rag_pipeline.vector_store import VectorMatch, VectorStore
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("local_vector_store")
+
+# Rows scored per block in the quantized first pass
+_SCAN_BLOCK_ROWS = 8192
+
+
+class _DocumentVectors:
+    """
+    On-disk vectors of one document, appended in place and memory-mapped
+    for search:
+
+        meta.json       dimension and quantized dtype
+        quantized.bin   int8 or float16 rows, L2-normalized before quantization
+        scales.bin      float32 per-row dequantization scale (int8 only)
+        full.bin        float32 normalized rows, only read for re-scoring
+        chunks.jsonl    one metadata record per row
+
+    Records (chunk text included) stay on disk as well; only their byte
+    offsets and the id lookup are kept in memory. chunks.jsonl is written
+    last, and on load every file is cut back to the rows all of them hold
+    in full, so an interrupted append cannot misalign rows and records.
+    Upserting an id that is already stored overwrites its row.
+    """
+
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = dtype
+        self.dim: Optional[int] = None
+        self._rows = 0
+        self._quantized: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._full: Optional[np.memmap] = None
+        self._offsets: List[int] = []
+        self._row_by_id: Dict[str, int] = {}
+
+        if os.path.exists(self._file("meta.json")):
+            self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _size(self, name: str) -> int:
+        path = self._file(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _row_bytes(self) -> Dict[str, int]:
+        """Size of one row in each of the binary files"""
+        row_bytes = {
+            "quantized.bin": self.dim * (2 if self.dtype == "float16" else 1),
+            "full.bin": self.dim * 4,
+        }
+        if self.dtype == "int8":
+            row_bytes["scales.bin"] = 4
+        return row_bytes
+
+    def _load(self):
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = meta["dtype"]
+
+        ids = []
+        offset = 0
+        if os.path.exists(self._file("chunks.jsonl")):
+            with open(self._file("chunks.jsonl"), "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offsets.append(offset)
+                    ids.append(json.loads(line)["id"])
+                    offset += len(line)
+
+        row_bytes = self._row_bytes()
+        rows = min([len(ids)] + [
+            self._size(name) // size for name, size in row_bytes.items()
+        ])
+        expected = {name: rows * size for name, size in row_bytes.items()}
+        expected["chunks.jsonl"] = self._offsets[rows] if rows < len(ids) else offset
+        if any(self._size(name) != size for name, size in expected.items()):
+            logger.warning(
+                f"Cutting {self.path} back to its {rows} complete rows after an "
+                f"interrupted write"
+            )
+            for name, size in expected.items():
+                if os.path.exists(self._file(name)):
+                    os.truncate(self._file(name), size)
+
+        del self._offsets[rows:]
+        self._rows = rows
+        self._row_by_id = {id_: row for row, id_ in enumerate(ids[:rows])}
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        # Symmetric per-row int8 scalar quantization
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+
+    def append(self, ids: List[str], vectors: np.ndarray, metadata: List[Dict]):
+        if self.dim is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.dim = int(vectors.shape[1])
+            with open(self._file("meta.json"), "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match "
+                f"stored dimension {self.dim}"
+            )
+
+        # The last of repeated ids wins, like an upsert
+        latest = {id_: i for i, id_ in enumerate(ids)}
+        order = sorted(latest.values())
+        ids = [ids[i] for i in order]
+        metadata = [metadata[i] for i in order]
+        vectors = vectors[order]
+
+        # Normalize at write time so cosine similarity is a plain dot product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+        quantized, scales = self._quantize(vectors)
+        lines = [
+            (json.dumps({"id": id_, "metadata": meta}) + "\n").encode()
+            for id_, meta in zip(ids, metadata)
+        ]
+
+        stored = [i for i, id_ in enumerate(ids) if id_ in self._row_by_id]
+        if stored:
+            self._overwrite(
+                [self._row_by_id[ids[i]] for i in stored],
+                quantized[stored],
+                scales[stored] if scales is not None else None,
+                vectors[stored],
+                [lines[i] for i in stored],
+            )
+        new = [i for i, id_ in enumerate(ids) if id_ not in self._row_by_id]
+        if new:
+            self._append_rows(
+                [ids[i] for i in new],
+                quantized[new],
+                scales[new] if scales is not None else None,
+                vectors[new],
+                [lines[i] for i in new],
+            )
+        # Re-map lazily so readers see the new rows
+        self._quantized = self._scales = self._full = None
+
+    def _row_arrays(self, quantized, scales, vectors):
+        arrays = [("quantized.bin", quantized), ("full.bin", vectors)]
+        if scales is not None:
+            arrays.append(("scales.bin", scales))
+        return arrays
+
+    def _append_rows(self, ids, quantized, scales, vectors, lines):
+        for name, array in self._row_arrays(quantized, scales, vectors):
+            with open(self._file(name), "ab") as f:
+                f.write(array.tobytes())
+
+        # Records go last: rows only count once their record is complete
+        with open(self._file("chunks.jsonl"), "ab") as f:
+            offset = f.tell()
+            for id_, line in zip(ids, lines):
+                f.write(line)
+                self._offsets.append(offset)
+                self._row_by_id[id_] = self._rows
+                self._rows += 1
+                offset += len(line)
+
+    def _overwrite(self, rows, quantized, scales, vectors, lines):
+        row_bytes = self._row_bytes()
+        for name, array in self._row_arrays(quantized, scales, vectors):
+            with open(self._file(name), "r+b") as f:
+                for row, value in zip(rows, array):
+                    f.seek(row * row_bytes[name])
+                    f.write(value.tobytes())
+
+        # Records vary in length, so rewrite them and swap the file in whole
+        replaced = dict(zip(rows, lines))
+        offsets = []
+        offset = 0
+        temp_path = self._file("chunks.jsonl.tmp")
+        with open(self._file("chunks.jsonl"), "rb") as source, open(temp_path, "wb") as f:
+            for row in range(self._rows):
+                line = source.readline()
+                line = replaced.get(row, line)
+                f.write(line)
+                offsets.append(offset)
+                offset += len(line)
+        os.replace(temp_path, self._file("chunks.jsonl"))
+        self._offsets = offsets
+
+    def _map(self):
+        if self._quantized is None and self._rows:
+            quantized_dtype = np.float16 if self.dtype == "float16" else np.int8
+            shape = (self._rows, self.dim)
+            self._quantized = np.memmap(
+                self._file("quantized.bin"), dtype=quantized_dtype, mode="r", shape=shape
+            )
+            self._full = np.memmap(
+                self._file("full.bin"), dtype=np.float32, mode="r", shape=shape
+            )
+            if self.dtype == "int8":
+                self._scales = np.memmap(
+                    self._file("scales.bin"), dtype=np.float32, mode="r", shape=(self._rows,)
+                )
+
+    def search(
+        self, query: np.ndarray, top_k: int, rescore_k: int
+    ) -> List[Tuple[int, float]]:
+        """Quantized first pass, then exact re-scoring of a shortlist"""
+        self._map()
+        if not self._rows:
+            return []
+
+        approx = np.empty(self._rows, dtype=np.float32)
+        for start in range(0, self._rows, _SCAN_BLOCK_ROWS):
+            block = self._quantized[start: start + _SCAN_BLOCK_ROWS]
+            scores = block.astype(np.float32) @ query
+            if self._scales is not None:
+                scores *= self._scales[start: start + _SCAN_BLOCK_ROWS]
+            approx[start: start + len(block)] = scores
+
+        shortlist_size = min(rescore_k, self._rows)
+        shortlist = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+        shortlist.sort()  # Sequential reads from the full-precision file
+
+        exact = self._full[shortlist] @ query
+        order = np.argsort(-exact)[:top_k]
+        return [(int(shortlist[i]), float(exact[i])) for i in order]
+
+    def record(self, row: int) -> Dict:
+        with open(self._file("chunks.jsonl"), "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())
+
+    def values(self, row: int) -> List[float]:
+        self._map()
+        return self._full[row].tolist()
+
+    def find(self, chunk_id: str) -> Optional[int]:
+        return self._row_by_id.get(chunk_id)
+
+    def delete(self):
+        """Remove every row of the document, on disk too"""
+        self._quantized = self._scales = self._full = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Self-hosted vector backend with quantized, memory-mapped storage per
+    document. The quantized arrays are what gets scanned, so only they need
+    to stay hot; full-precision rows are read for the shortlist only and
+    cold documents are left to the OS page cache.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        dtype: str = "int8",
+        rescore_factor: int = 4,
+        max_open_documents: int = 64,
+        **retrieval_options,
+    ):
+        super().__init__(**retrieval_options)
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported local vector dtype: {dtype}")
+        if rescore_factor < 1:
+            raise ValueError(
+                f"Local vector rescore factor must be at least 1, got {rescore_factor}"
+            )
+        self.root_dir = root_dir
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self.max_open_documents = max_open_documents
+        # Least recently used documents are closed, their files stay on disk
+        self._documents: "OrderedDict[str, _DocumentVectors]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+        logger.info(
+            f"Initialized LocalVectorStore at {root_dir} with dtype={dtype}, "
+            f"rescore_factor={rescore_factor}"
+        )
+
+    def _document(self, file_id: str) -> _DocumentVectors:
+        document = self._documents.get(file_id)
+        if document is None:
+            document = _DocumentVectors(os.path.join(self.root_dir, file_id), self.dtype)
+            self._documents[file_id] = document
+            while len(self._documents) > self.max_open_documents:
+                self._documents.popitem(last=False)
+        else:
+            self._documents.move_to_end(file_id)
+        return document
+
+    def _all_file_ids(self) -> List[str]:
+        return [
+            name for name in os.listdir(self.root_dir)
+            if os.path.isdir(os.path.join(self.root_dir, name))
+        ]
+
+    def _upsert_sync(self, vectors: List[Dict]):
+        by_file: Dict[str, List[Dict]] = {}
+        for vector in vectors:
+            by_file.setdefault(vector["metadata"]["file_id"], []).append(vector)
+
+        with self._lock:
+            for file_id, file_vectors in by_file.items():
+                self._document(file_id).append(
+                    [v["id"] for v in file_vectors],
+                    np.asarray([v["values"] for v in file_vectors], dtype=np.float32),
+                    [v["metadata"] for v in file_vectors],
+                )
+
+    def _query_sync(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+    ) -> List[VectorMatch]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        file_id = (metadata_filter or {}).get("file_id")
+        file_ids = [file_id] if file_id else self._all_file_ids()
+        rescore_k = top_k * self.rescore_factor
+
+        matches = []
+        with self._lock:
+            for doc_id in file_ids:
+                document = self._document(doc_id)
+                for row, score in document.search(query, top_k, rescore_k):
+                    record = document.record(row)
+                    matches.append(
+                        VectorMatch(
+                            id=record["id"],
+                            score=score,
+                            values=document.values(row),
+                            metadata=record["metadata"],
+                        )
+                    )
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:top_k]
+
+    def _fetch_sync(self, ids: List[str], file_id: str) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            document = self._document(file_id)
+            for chunk_id in ids:
+                row = document.find(chunk_id)
+                if row is not None:
+                    found[chunk_id] = document.values(row)
+        return found
+
+    def _delete_sync(self, file_id: str):
+        with self._lock:
+            self._document(file_id).delete()
+            self._documents.pop(file_id, None)
+
+    async def _upsert_vectors(self, vectors: List[Dict]):
+        await asyncio.to_thread(self._upsert_sync, vectors)
+
+    async def _delete_vectors(self, file_id: str):
+        await asyncio.to_thread(self._delete_sync, file_id)
+
+    async def _query_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+    ) -> List[VectorMatch]:
+        return await asyncio.to_thread(
+            self._query_sync, query_embedding, top_k, metadata_filter
+        )
+
+    async def _fetch_values(self, ids: List[str], file_id: str) -> Dict[str, List[float]]:
+        return await asyncio.to_thread(self._fetch_sync, ids, file_id)
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.metrics import metrics
+from app.services.rag_pipeline.embeddings import OllamaEmbeddings
+from app.services.rag_pipeline.llm import OllamaLLM, record_model_load
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("model_warmer")
+
+
+class ModelWarmer:
+    """
+    Preloads the generation and embedding models on every Ollama host at
+    startup, then keeps them loaded: while the app has been used within
+    `idle_seconds`, each model is pinged every `refresh_seconds` so its
+    keep_alive never lapses between user requests.
+    """
+
+    def __init__(
+        self,
+        llm: OllamaLLM,
+        embeddings: OllamaEmbeddings,
+        refresh_seconds: float = 300,
+        idle_seconds: float = 7200,
+        request_timeout: float = 300,
+    ):
+        self.llm = llm
+        self.embeddings = embeddings
+        self.refresh_seconds = refresh_seconds
+        self.idle_seconds = idle_seconds
+        self.request_timeout = request_timeout
+        self.warm: Dict[str, bool] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _warm_llm(self, client: httpx.AsyncClient, base_url: str):
+        # An empty prompt only loads the model; num_ctx must match real
+        # requests or Ollama reloads the model on the first chat anyway
+        body = {
+            "model": self.llm.model_name,
+            "prompt": "",
+            "options": {"num_ctx": self.llm.num_ctx},
+        }
+        if self.llm.keep_alive is not None:
+            body["keep_alive"] = self.llm.keep_alive
+        response = await client.post(f"{base_url}/api/generate", json=body)
+        response.raise_for_status()
+        return response.json()
+
+    async def _warm_embeddings(self, client: httpx.AsyncClient, base_url: str):
+        body = {"model": self.embeddings.model_name, "prompt": "warm-up"}
+        if self.embeddings.keep_alive is not None:
+            body["keep_alive"] = self.embeddings.keep_alive
+        response = await client.post(f"{base_url}/api/embeddings", json=body)
+        response.raise_for_status()
+        return response.json()
+
+    async def _warm_host(self, role: str, base_url: str):
+        model_name = (
+            self.llm.model_name if role == "generate" else self.embeddings.model_name
+        )
+        key = f"{role}:{base_url}"
+        start_time = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=self.request_timeout) as client:
+                if role == "generate":
+                    result = await self._warm_llm(client, base_url)
+                else:
+                    result = await self._warm_embeddings(client, base_url)
+            # /api/embeddings reports no load_duration, so warm-up wall time
+            # is recorded as well
+            record_model_load(model_name, result)
+            elapsed = time.perf_counter() - start_time
+            metrics.histogram("ollama_warmup_seconds").observe(elapsed)
+            self.warm[key] = True
+            logger.debug(f"Warmed {model_name} on {base_url} in {elapsed:.2f}s")
+        except Exception as e:
+            self.warm[key] = False
+            logger.warning(f"Could not warm {model_name} on {base_url}: {str(e)}")
+
+    async def warm_up(self, roles=("generate", "embed")):
+        """Load the models on every host of the given roles concurrently"""
+        jobs = []
+        if "generate" in roles:
+            jobs += [self._warm_host("generate", url) for url in self.llm.hosts.urls]
+        if "embed" in roles:
+            jobs += [self._warm_host("embed", url) for url in self.embeddings.hosts.urls]
+        await asyncio.gather(*jobs)
+
+    def _recently_used(self, last_used_at: Optional[float]) -> bool:
+        return (
+            last_used_at is not None
+            and time.monotonic() - last_used_at < self.idle_seconds
+        )
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            roles = [
+                role
+                for role, last_used_at in (
+                    ("generate", self.llm.last_used_at),
+                    ("embed", self.embeddings.last_used_at),
+                )
+                if self._recently_used(last_used_at)
+            ]
+            if roles:
+                await self.warm_up(roles)
+
+    def start(self):
+        """Warm up now and keep refreshing in the background"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        start_time = time.perf_counter()
+        await self.warm_up()
+        logger.info(
+            f"Model warm-up finished in {time.perf_counter() - start_time:.2f}s: "
+            f"{self.warm}"
+        )
+        if self.refresh_seconds > 0:
+            await self._refresh_loop()
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
@@ -0,0 +1,129 @@
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List
+
+import httpx
+
+from app.core.deadline import current_deadline
+from app.core.metrics import metrics
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("ollama_pool")
+
+
+@dataclass
+class _Host:
+    url: str
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+
+
+def parse_urls(urls: str) -> List[str]:
+    """Split a comma-separated URL setting, dropping blanks and trailing slashes"""
+    return [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+
+
+class OllamaHostPool:
+    """
+    Routes requests of one role (embedding or generation) across Ollama
+    hosts, to the healthy host with the fewest outstanding requests.
+
+    Health is checked passively: a host whose requests fail
+    `failure_threshold` times in a row is ejected for `ejection_seconds`,
+    after which it gets traffic again and one success fully restores it.
+    Timeouts after the request's own deadline ran out are not failures.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        role: str,
+        failure_threshold: int = 3,
+        ejection_seconds: float = 30.0,
+    ):
+        if not urls:
+            raise ValueError(f"No Ollama hosts configured for {role}")
+        self.role = role
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self._hosts: Dict[str, _Host] = {url: _Host(url) for url in urls}
+        self._ejections = metrics.counter(f"ollama_{role}_ejections_total")
+        self._outstanding = metrics.gauge(f"ollama_{role}_outstanding")
+        logger.info(f"Ollama {role} pool: {', '.join(self._hosts)}")
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self._hosts)
+
+    def pick(self, exclude: Iterable[str] = ()) -> str:
+        """Least outstanding healthy host; if all are ejected, the one back soonest"""
+        now = time.monotonic()
+        candidates = [h for h in self._hosts.values() if h.url not in exclude]
+        if not candidates:
+            candidates = list(self._hosts.values())
+        healthy = [h for h in candidates if h.ejected_until <= now]
+        if healthy:
+            return min(healthy, key=lambda h: h.outstanding).url
+        return min(candidates, key=lambda h: h.ejected_until).url
+
+    def _record_success(self, host: _Host):
+        if host.consecutive_failures >= self.failure_threshold:
+            logger.info(f"Ollama {self.role} host {host.url} recovered")
+        host.consecutive_failures = 0
+        host.ejected_until = 0.0
+
+    def _record_failure(self, host: _Host, error: Exception):
+        host.consecutive_failures += 1
+        if host.consecutive_failures >= self.failure_threshold:
+            host.ejected_until = time.monotonic() + self.ejection_seconds
+            self._ejections.inc()
+            logger.warning(
+                f"Ejecting Ollama {self.role} host {host.url} for "
+                f"{self.ejection_seconds}s after {host.consecutive_failures} "
+                f"consecutive failures, last: {str(error)}"
+            )
+
+    @staticmethod
+    def _is_host_failure(error: Exception) -> bool:
+        # Client errors (4xx) say nothing about the health of the host
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        if isinstance(error, httpx.TimeoutException):
+            # Timeouts are cut to the request's deadline; once it has run
+            # out, the caller gave up rather than the host failing
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
+                return False
+        return isinstance(error, httpx.TransportError)
+
+    @asynccontextmanager
+    async def request(self, exclude: Iterable[str] = ()) -> AsyncIterator[str]:
+        """Pick a host and track the request made to it inside the block"""
+        host = self._hosts[self.pick(exclude)]
+        host.outstanding += 1
+        self._outstanding.inc()
+        try:
+            yield host.url
+        except Exception as e:
+            if self._is_host_failure(e):
+                self._record_failure(host, e)
+            raise
+        else:
+            self._record_success(host)
+        finally:
+            host.outstanding -= 1
+            self._outstanding.dec()
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": host.url,
+                "outstanding": host.outstanding,
+                "consecutive_failures": host.consecutive_failures,
+                "ejected_for_seconds": round(max(host.ejected_until - now, 0.0), 1),
+            }
+            for host in self._hosts.values()
+        ]
@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List
+
+from app.services.rag_pipeline.context_packer import ContextPacker
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("prompt_sessions")
+
+
+@dataclass
+class _Session:
+    chunks: List[Dict] = field(default_factory=list)
+    last_used: float = 0.0
+
+
+class PromptSessions:
+    """
+    Context pinned per (user, document) conversation so that consecutive
+    prompts share a byte-identical prefix. Ollama keeps the KV cache of the
+    previous prompt and only evaluates tokens after the first difference, so
+    chunks sent in earlier turns keep their place and new ones are appended.
+
+    Pinned chunks are kept only up to the first one the current question
+    did not retrieve again; everything after it would not match the cached
+    prefix anyway. A session starts over when the best new chunk no longer
+    fits next to the pinned ones. Every chunk sent was retrieved for the
+    current question and the best one is always among them, so pinning
+    never crowds out relevant context.
+    """
+
+    def __init__(
+        self,
+        packer: ContextPacker,
+        max_sessions: int = 256,
+        ttl_seconds: float = 1800,
+    ):
+        self.packer = packer
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[Hashable, _Session]" = OrderedDict()
+
+    def _session(self, key: Hashable) -> _Session:
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is None or now - session.last_used > self.ttl_seconds:
+            session = _Session()
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        session.last_used = now
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    @staticmethod
+    def _same_chunk(pinned: Dict, doc: Dict) -> bool:
+        """Whether a pinned chunk, possibly trimmed by the packer, is `doc`"""
+        return (
+            pinned["metadata"]["page_number"] == doc["metadata"]["page_number"]
+            and doc["text"].startswith(pinned["text"])
+        )
+
+    def arrange(self, key: Hashable, context: List[Dict], token_budget: int) -> List[Dict]:
+        """Still retrieved pinned chunks first in their original order, then new chunks that fit"""
+        session = self._session(key)
+        pinned = []
+        for doc in session.chunks:
+            if not any(self._same_chunk(doc, retrieved) for retrieved in context):
+                break
+            pinned.append(doc)
+        if len(pinned) < len(session.chunks):
+            logger.info(
+                f"Unpinning {len(session.chunks) - len(pinned)} chunks for {key}, "
+                f"they were not retrieved for this question"
+            )
+        new = [
+            doc for doc in context
+            if not any(self._same_chunk(kept, doc) for kept in pinned)
+        ]
+        separator_tokens = self.packer.estimate_tokens("\n\n")
+        pinned_tokens = sum(
+            self.packer.estimate_tokens(self.packer.format_chunk(doc)) + separator_tokens
+            for doc in pinned
+        )
+
+        packed_new = self.packer.pack(new, max(token_budget - pinned_tokens, 0))
+        best_new = max(new, key=lambda x: x["metadata"]["score"], default=None)
+        # pack() returns the original dict only for chunks that fit untrimmed
+        if best_new is not None and (not packed_new or packed_new[0] is not best_new):
+            if pinned:
+                logger.info(
+                    f"Resetting pinned context of {len(pinned)} chunks for {key}, "
+                    f"the best new chunk does not fit next to it"
+                )
+            pinned = []
+            packed_new = self.packer.pack(context, token_budget)
+
+        session.chunks = pinned + packed_new
+        logger.debug(
+            f"Prompt session {key}: {len(pinned)} pinned and "
+            f"{len(packed_new)} new chunks"
+        )
+        return session.chunks
+
+    def reset(self, key: Hashable):
+        self._sessions.pop(key, None)
@@ -0,0 +1,68 @@
+from typing import List
+
+import numpy as np
+
+from app.utils.logging import get_pipeline_logger
+
+logger = get_pipeline_logger("reranker")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length rows (zero vectors stay zero)"""
+    return vectors / np.maximum(
+        np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12
+    )
+
+
+def cosine_similarities(
+    query_embedding: List[float], candidate_embeddings: List[List[float]]
+) -> List[float]:
+    """Cosine similarity of each candidate to the query"""
+    if not candidate_embeddings:
+        return []
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    return (candidates @ query).tolist()
+
+
+def mmr_rerank(
+    query_embedding: List[float],
+    candidate_embeddings: List[List[float]],
+    top_k: int,
+    lambda_mult: float = 0.7,
+) -> List[int]:
+    """
+    Select up to top_k candidate indices by maximal marginal relevance.
+
+    All cosine similarities are computed up front as one matrix product;
+    the selection loop only runs top_k times over NumPy vectors.
+    """
+    if not candidate_embeddings or top_k <= 0:
+        return []
+
+    # Normalize so dot products are cosine similarities
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    n = len(candidates)
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.zeros(n, dtype=np.float32)
+
+    for _ in range(min(top_k, n)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+
+        selected.append(index)
+        available[index] = False
+        if len(selected) == 1:
+            max_similarity = similarity[index].copy()
+        else:
+            np.maximum(max_similarity, similarity[index], out=max_similarity)
+
+    logger.debug(f"MMR selected {selected} from {n} candidates")
+    return selected
@@ -1,40 +1,121 @@
+import asyncio
+import multiprocessing
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pinecone import Pinecone
-
-from app.services.rag_pipeline.text_processor import TextProcessor
+from app.services.rag_pipeline.keyword_index import (KeywordIndex,
+                                                     reciprocal_rank_fusion)
+from app.services.rag_pipeline.reranker import cosine_similarities, mmr_rerank
+from app.services.rag_pipeline.text_processor import (TextProcessor,
+                                                      process_texts)
 from app.utils.logging import get_pipeline_logger
 
 logger = get_pipeline_logger("vector_store")
 
 
-class PineconeStore:
-    def __init__(self, api_key: str, environment: str, index_name: str):
-        pc = Pinecone(api_key=api_key)
-        self.index = pc.Index(index_name)
+@dataclass
+class VectorMatch:
+    """A single vector search hit, shaped like a Pinecone match"""
+    id: str
+    score: float
+    values: List[float]
+    metadata: Dict[str, Any]
+
+
+class VectorStore(ABC):
+    """
+    Retrieval logic shared by every vector backend: chunk metadata, hybrid
+    keyword fusion, score cutoff and MMR. Backends implement the storage
+    primitives `_upsert_vectors`, `_query_vectors`, `_fetch_values` and
+    `_delete_vectors`.
+    """
+
+    def __init__(
+        self,
+        keyword_index: Optional[KeywordIndex] = None,
+        rrf_k: int = 60,
+        mmr_enabled: bool = False,
+        mmr_lambda: float = 0.7,
+        mmr_candidate_pool: int = 20,
+        text_processing_workers: int = 0,
+    ):
         self.text_processor = TextProcessor()
-        logger.info(f"Initialized PineconeStore with index: {index_name}")
+        self.text_processing_workers = text_processing_workers
+        self._text_executor: Optional[ProcessPoolExecutor] = None
+        self.keyword_index = keyword_index
+        self.rrf_k = rrf_k
+        self.mmr_enabled = mmr_enabled
+        self.mmr_lambda = mmr_lambda
+        self.mmr_candidate_pool = mmr_candidate_pool
+
+    def warm_up(self):
+        """Load heavy resources ahead of the first request (blocking)"""
+        self.text_processor.load_resources()
+
+    def close(self):
+        """Stop the text processing worker processes, if any were started (blocking)"""
+        if self._text_executor is not None:
+            self._text_executor.shutdown(cancel_futures=True)
+            self._text_executor = None
+
+    @abstractmethod
+    async def _upsert_vectors(self, vectors: List[Dict]):
+        """Store vectors given as {"id", "values", "metadata"} dicts"""
+
+    @abstractmethod
+    async def _query_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+    ) -> List[VectorMatch]:
+        """Return up to top_k matches with metadata and values"""
+
+    @abstractmethod
+    async def _fetch_values(self, ids: List[str], file_id: str) -> Dict[str, List[float]]:
+        """Return stored vector values by id, all of them chunks of `file_id`"""
+
+    @abstractmethod
+    async def _delete_vectors(self, file_id: str):
+        """Remove every vector of a document"""
+
+    async def _process_texts(self, texts: List[str]) -> List[Dict]:
+        """Preprocess chunk texts off the event loop, in worker processes if configured"""
+        if self.text_processing_workers <= 0:
+            return await asyncio.to_thread(self.text_processor.process_batch, texts)
+
+        if self._text_executor is None:
+            self._text_executor = ProcessPoolExecutor(
+                max_workers=self.text_processing_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._text_executor, process_texts, texts)
 
     async def upsert_documents(
         self, embeddings: List[List[float]], documents: List[Dict]
     ):
-        """Upsert documents and their embeddings to Pinecone"""
+        """Upsert documents and their embeddings to the vector store"""
         logger.info(f"Starting upsert of {
-                    len(documents)} documents to Pinecone")
+                    len(documents)} documents to the vector store")
 
         try:
+            # Process text for better searchability, one pass per chunk
+            processed = await self._process_texts([doc["text"] for doc in documents])
+
             vectors = []
-            for i, (embedding, doc) in enumerate(zip(embeddings, documents)):
-                # Process text for better searchability
-                processed_text = self.text_processor.preprocess_text(
-                    doc["text"])
-                keywords = self.text_processor.extract_keywords(doc["text"])
+            keyword_rows = []
+            for embedding, doc, text_info in zip(embeddings, documents, processed):
+                processed_text = text_info["processed_text"]
 
                 metadata = {
                     "text": doc["text"],
                     "processed_text": processed_text,
-                    "keywords": keywords,
+                    "keywords": text_info["keywords"],
                     "file_path": doc["metadata"]["file_path"],
                     "page_number": doc["metadata"]["page_number"],
                     "file_id": doc["metadata"]["file_path"]
@@ -49,16 +130,168 @@ class PineconeStore:
                         "metadata": metadata,
                     }
                 )
+                keyword_rows.append(
+                    {
+                        "text": doc["text"],
+                        "processed_text": processed_text,
+                        "chunk_id": doc["metadata"]["chunk_id"],
+                        "file_id": metadata["file_id"],
+                        "file_path": metadata["file_path"],
+                        "page_number": metadata["page_number"],
+                    }
+                )
+
+            await self._upsert_vectors(vectors)
 
-            # Upsert to Pinecone
-            self.index.upsert(vectors=vectors)
+            # Keep the local keyword index in step with the vectors
+            if self.keyword_index:
+                await self.keyword_index.add_documents(keyword_rows)
             logger.info(f"Successfully completed upsert of {
                         len(documents)} documents")
 
         except Exception as e:
-            logger.error(f"Error during Pinecone upsert: {str(e)}")
+            logger.error(f"Error during vector store upsert: {str(e)}")
             raise
 
+    async def delete_document(self, file_id: str):
+        """Remove a document's vectors and keyword entries, e.g. before re-ingesting it"""
+        await self._delete_vectors(file_id)
+        if self.keyword_index:
+            await self.keyword_index.delete_document(file_id)
+        logger.info(f"Deleted stored chunks of file_id: {file_id}")
+
+    @staticmethod
+    def _match_to_candidate(match) -> Dict:
+        """Convert a vector match into the result dict used downstream"""
+        candidate = {
+            "id": match.id,
+            "values": match.values,
+            "text": match.metadata["text"],
+            "metadata": {
+                "file_path": match.metadata["file_path"],
+                "page_number": match.metadata["page_number"],
+                "score": float(match.score),
+                "file_id": match.metadata["file_id"],
+            },
+        }
+
+        # Add processed_text if available
+        if "processed_text" in match.metadata:
+            candidate["processed_text"] = match.metadata["processed_text"]
+
+        return candidate
+
+    def _fuse_keyword_hits(
+        self, candidates: List[Dict], keyword_hits: List[Dict]
+    ) -> List[Dict]:
+        """
+        Merge BM25 hits into the vector candidates, returned in
+        reciprocal-rank fusion order. Scores are left alone: vector
+        candidates keep their cosine similarity and every keyword hit
+        carries its BM25 score as "keyword_score", so cutoffs can be applied
+        to each on its own scale. Keyword-only hits have no similarity yet.
+        """
+        fused = reciprocal_rank_fusion(
+            [
+                [candidate["id"] for candidate in candidates],
+                [hit["chunk_id"] for hit in keyword_hits],
+            ],
+            k=self.rrf_k,
+        )
+
+        by_id = {candidate["id"]: candidate for candidate in candidates}
+        for hit in keyword_hits:
+            candidate = by_id.setdefault(hit["chunk_id"], {
+                "id": hit["chunk_id"],
+                "text": hit["text"],
+                "metadata": {
+                    "file_path": hit["file_path"],
+                    "page_number": hit["page_number"],
+                    "file_id": hit["file_id"],
+                },
+                "processed_text": hit["processed_text"],
+            })
+            candidate["keyword_score"] = hit["bm25_score"]
+
+        logger.info(
+            f"Fused {len(candidates)} vector and {len(keyword_hits)} keyword "
+            f"hits into {len(by_id)} candidates"
+        )
+        return sorted(by_id.values(), key=lambda c: fused[c["id"]], reverse=True)
+
+    async def _fetch_candidate_values(
+        self, candidates: List[Dict]
+    ) -> Dict[str, List[float]]:
+        """Vector values of the candidates, one fetch per document"""
+        ids_by_file: Dict[str, List[str]] = {}
+        for candidate in candidates:
+            ids_by_file.setdefault(candidate["metadata"]["file_id"], []).append(
+                candidate["id"]
+            )
+        fetched = {}
+        for file_id, ids in ids_by_file.items():
+            fetched.update(await self._fetch_values(ids, file_id))
+        return fetched
+
+    async def _score_keyword_only(
+        self, query_embedding: List[float], candidates: List[Dict]
+    ):
+        """
+        Give keyword-only hits their cosine similarity to the query, so
+        every result's score means the same thing. Their vectors are
+        fetched together and kept for MMR.
+        """
+        missing = [c for c in candidates if "score" not in c["metadata"]]
+        if not missing:
+            return
+        fetched = await self._fetch_candidate_values(missing)
+        for candidate in missing:
+            candidate["values"] = fetched.get(candidate["id"])
+        scored = [c for c in missing if c["values"]]
+        similarities = cosine_similarities(
+            query_embedding, [c["values"] for c in scored]
+        )
+        for candidate, similarity in zip(scored, similarities):
+            candidate["metadata"]["score"] = similarity
+        for candidate in missing:
+            candidate["metadata"].setdefault("score", 0.0)
+
+    async def _keyword_search(
+        self, query_text: str, file_id: str, limit: int
+    ) -> List[Dict]:
+        # Lemmatizing is blocking NLTK work, keep it off the event loop
+        processed_query = await asyncio.to_thread(
+            self.text_processor.preprocess_text, query_text
+        )
+        return await self.keyword_index.search(
+            query_text, processed_query, file_id, limit=limit
+        )
+
+    async def _apply_mmr(
+        self, query_embedding: List[float], candidates: List[Dict], top_k: int
+    ) -> List[Dict]:
+        """Re-rank candidates by maximal marginal relevance"""
+        missing = [c for c in candidates if not c.get("values")]
+        if missing:
+            # Keyword-only hits carry no embedding, fetch them together
+            fetched = await self._fetch_candidate_values(missing)
+            for candidate in candidates:
+                if candidate["id"] in fetched:
+                    candidate["values"] = fetched[candidate["id"]]
+
+        candidates = [c for c in candidates if c.get("values")]
+        selected = mmr_rerank(
+            query_embedding,
+            [c["values"] for c in candidates],
+            top_k=top_k,
+            lambda_mult=self.mmr_lambda,
+        )
+        logger.info(
+            f"MMR kept {len(selected)} of {len(candidates)} candidates "
+            f"(lambda={self.mmr_lambda})"
+        )
+        return [candidates[i] for i in selected]
+
     async def similarity_search(
         self,
         query_embedding: List[float],
@@ -66,9 +299,16 @@ class PineconeStore:
         metadata_filter: Optional[Dict[str, Any]] = None,
         score_threshold: float = 0.2,
         min_score_cutoff: float = 0.3,  # Added minimum score threshold
+        query_text: Optional[str] = None,
     ) -> List[Dict]:
         """
-        Perform similarity search with improved filtering and scoring
+        Perform similarity search with improved filtering and scoring.
+        When a keyword index is configured and `query_text` is given, BM25
+        and vector search run concurrently; a result is kept if either its
+        similarity or its BM25 score is close to the best one, and kept
+        results are ordered by reciprocal-rank fusion.
+        With MMR enabled, a larger candidate pool is fetched and the final
+        top_k is picked by maximal marginal relevance.
         """
         try:
             start_time = datetime.utcnow()
@@ -77,66 +317,85 @@ class PineconeStore:
                     metadata_filter}"
             )
 
-            # Query Pinecone
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k * 2,  # Get more results for filtering
-                include_metadata=True,
-                include_values=True,
-                filter=metadata_filter,
-            )
+            # Get more results for filtering (and a wider pool for MMR)
+            fetch_k = top_k * 2
+            if self.mmr_enabled:
+                fetch_k = max(fetch_k, self.mmr_candidate_pool)
 
-            logger.info(f"Got {len(results.matches)
-                               } initial matches from Pinecone")
+            vector_search = self._query_vectors(
+                query_embedding, fetch_k, metadata_filter
+            )
 
-            # Find the highest score
-            if results.matches:
-                max_score = max(match.score for match in results.matches)
-                logger.info(f"Highest similarity score: {max_score:.4f}")
+            file_id = (metadata_filter or {}).get("file_id")
+            if self.keyword_index and query_text and file_id:
+                matches, keyword_hits = await asyncio.gather(
+                    vector_search, self._keyword_search(query_text, file_id, fetch_k)
+                )
             else:
+                matches = await vector_search
+                keyword_hits = []
+
+            logger.info(f"Got {len(matches)} initial vector matches")
+
+            if not matches and not keyword_hits:
                 logger.warning("No matches found")
                 return []
 
-            # Only keep results close to the highest score
-            score_cutoff = max(
-                min_score_cutoff, max_score * 0.8
-            )  # Within 80% of max score
+            # Only keep results close to the best one on the same scale:
+            # similarity for vector matches, BM25 for keyword hits
+            if matches:
+                max_score = max(match.score for match in matches)
+                logger.info(f"Highest similarity score: {max_score:.4f}")
+                score_cutoff = max(
+                    score_threshold, min_score_cutoff, max_score * 0.8
+                )  # Within 80% of max score
+            else:
+                max_score = 0.0
+                score_cutoff = float("inf")
+                logger.info("No vector matches, using keyword hits only")
+            keyword_cutoff = max(
+                (hit["bm25_score"] for hit in keyword_hits), default=0.0
+            ) * 0.8
+
+            candidates = [
+                self._match_to_candidate(match) for match in matches
+            ]
+            if keyword_hits:
+                # Fusion only orders the candidates, the cutoffs decide
+                candidates = self._fuse_keyword_hits(candidates, keyword_hits)
+                await self._score_keyword_only(query_embedding, candidates)
+            rank = {c["id"]: position for position, c in enumerate(candidates)}
 
             # Post-process results
             processed_results = []
-            for match in results.matches:
-                # Skip results below threshold or cutoff
-                if match.score < score_threshold or match.score < score_cutoff:
+            for candidate in candidates:
+                score = candidate["metadata"]["score"]
+                keyword_score = candidate.pop("keyword_score", None)
+                # Skip results below both cutoffs
+                if score < score_cutoff and (
+                    keyword_score is None or keyword_score < keyword_cutoff
+                ):
                     continue
 
-                processed_result = {
-                    "text": match.metadata["text"],
-                    "metadata": {
-                        "file_path": match.metadata["file_path"],
-                        "page_number": match.metadata["page_number"],
-                        "score": float(match.score),
-                        "file_id": match.metadata["file_id"],
-                    },
-                }
-
-                # Add processed_text if available
-                if "processed_text" in match.metadata:
-                    processed_result["processed_text"] = match.metadata[
-                        "processed_text"
-                    ]
-
                 logger.debug(
-                    f"Match score: {match.score:.4f}, "
-                    f"Page: {match.metadata['page_number']}, "
-                    f"Preview: {match.metadata['processed_text'][:100]}..."
+                    f"Match score: {score:.4f}, "
+                    f"Page: {candidate['metadata']['page_number']}, "
+                    f"Preview: {candidate.get('processed_text', '')[:100]}..."
                 )
 
-                processed_results.append(processed_result)
+                processed_results.append(candidate)
+
+            if self.mmr_enabled and len(processed_results) > top_k:
+                processed_results = await self._apply_mmr(
+                    query_embedding, processed_results, top_k
+                )
 
-            # Sort by score and take top_k
-            processed_results.sort(
-                key=lambda x: x["metadata"]["score"], reverse=True)
+            # Fused order for hybrid results (vector order otherwise), top_k
+            processed_results.sort(key=lambda x: rank[x["id"]])
             processed_results = processed_results[:top_k]
+            for result in processed_results:
+                result.pop("id", None)
+                result.pop("values", None)
 
             end_time = datetime.utcnow()
             logger.info(
@@ -160,3 +419,74 @@ class PineconeStore:
             logger.error(f"Error during similarity search: {
                          str(e)}", exc_info=True)
             raise
+
+
+class PineconeStore(VectorStore):
+    def __init__(
+        self,
+        api_key: str,
+        environment: str,
+        index_name: str,
+        **retrieval_options,
+    ):
+        super().__init__(**retrieval_options)
+        self.api_key = api_key
+        self.index_name = index_name
+        self._index = None
+        self._index_lock = threading.Lock()
+        logger.info(f"Initialized PineconeStore with index: {index_name}")
+
+    @property
+    def index(self):
+        """Pinecone index handle, connected on first use"""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    from pinecone import Pinecone
+
+                    pc = Pinecone(api_key=self.api_key)
+                    self._index = pc.Index(self.index_name)
+                    logger.info(f"Connected to Pinecone index: {self.index_name}")
+        return self._index
+
+    def warm_up(self):
+        super().warm_up()
+        self.index
+
+    async def _upsert_vectors(self, vectors: List[Dict]):
+        await asyncio.to_thread(lambda: self.index.upsert(vectors=vectors))
+
+    async def _query_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+    ) -> List[VectorMatch]:
+        # The index property may connect, so resolve it off the event loop too
+        results = await asyncio.to_thread(
+            lambda: self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                include_metadata=True,
+                include_values=True,
+                filter=metadata_filter,
+            )
+        )
+        return [
+            VectorMatch(
+                id=match.id,
+                score=match.score,
+                values=match.values,
+                metadata=match.metadata,
+            )
+            for match in results.matches
+        ]
+
+    async def _delete_vectors(self, file_id: str):
+        await asyncio.to_thread(
+            lambda: self.index.delete(filter={"file_id": file_id})
+        )
+
+    async def _fetch_values(self, ids: List[str], file_id: str) -> Dict[str, List[float]]:
+        fetched = await asyncio.to_thread(lambda: self.index.fetch(ids=ids))
+        return {vector_id: vector.values for vector_id, vector in fetched.vectors.items()}
@@ -0,0 +1,88 @@
+import copy
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.services.query_cache import QueryCache, QueryCacheEntry
+from app.utils.logging import get_service_logger
+
+logger = get_service_logger("retrieval_cache")
+
+
+@dataclass
+class _CacheEntry(QueryCacheEntry):
+    results: List[Dict]
+
+
+class RetrievalCache(QueryCache):
+    """
+    TTL + LRU cache of similarity search results per (file_id, query).
+
+    Exact lookups use the normalized query text and need no embedding.
+    When a similarity threshold is set, a miss can still be served from an
+    entry of the same document whose query embedding is close enough.
+    """
+
+    entry_name = "retrievals"
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        super().__init__(ttl_seconds, similarity_threshold)
+        self.max_entries = max_entries
+        logger.info(
+            f"RetrievalCache initialized with max_entries={max_entries}, "
+            f"ttl={ttl_seconds}s, similarity_threshold={similarity_threshold}"
+        )
+
+    def _is_full(self) -> bool:
+        return len(self._entries) > self.max_entries
+
+    def get(self, file_id: str, query: str) -> Optional[List[Dict]]:
+        """Exact lookup on the normalized query"""
+        key = self.key(file_id, query)
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        logger.info(f"Retrieval cache hit for file_id: {file_id}")
+        self._touch(key)
+        return copy.deepcopy(entry.results)
+
+    def get_similar(
+        self, file_id: str, embedding: List[float]
+    ) -> Optional[List[Dict]]:
+        """Approximate lookup on query embedding within one document"""
+        match = (
+            self._lookup_similar(file_id, embedding)
+            if self.similarity_threshold is not None
+            else None
+        )
+        if match is None:
+            self.misses += 1
+            return None
+
+        key, entry, similarity = match
+        logger.info(
+            f"Retrieval cache approximate hit for file_id: {file_id} "
+            f"(similarity={similarity:.4f})"
+        )
+        self._touch(key)
+        return copy.deepcopy(entry.results)
+
+    def put(
+        self,
+        file_id: str,
+        query: str,
+        embedding: Optional[List[float]],
+        results: List[Dict],
+    ):
+        self._insert(
+            self.key(file_id, query),
+            _CacheEntry(
+                embedding=self._unit(embedding) if embedding is not None else None,
+                expires_at=self._expires_at(),
+                results=copy.deepcopy(results),
+            ),
+        )
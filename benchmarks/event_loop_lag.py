@@ -0,0 +1,135 @@
+"""
+Event loop lag while chat history is read concurrently, through the
+synchronous Session (queries run on the event loop, as endpoints did before)
+and through AsyncSession (queries run on the aiosqlite thread).
+
+    python -m benchmarks.event_loop_lag --messages 5000 --clients 50 --reads 20
+
+Needs the app's settings (SECRET_KEY) in the environment.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy import and_, create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.models.domain.message import Message
+from app.models.domain.vote import Vote
+from app.repositories.chat_repository import ChatRepository
+
+FILE_ID = "benchmark"
+USER_ID = 1
+PAGE_SIZE = 50
+
+
+def seed(url: str, messages: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all(
+            Message(
+                file_id=FILE_ID,
+                user_id=USER_ID,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i} " + "lorem ipsum " * 40,
+            )
+            for i in range(messages)
+        )
+        db.commit()
+    engine.dispose()
+
+
+async def sample_lag(lags: List[float], stop: asyncio.Event, interval: float = 0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started_at = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - started_at - interval, 0.0))
+
+
+def history_page_statement():
+    return select(
+        Message.id, Message.role, Message.content, Message.sources,
+        Message.upvotes, Message.downvotes, Message.created_at,
+        Vote.vote_type.label("user_vote"),
+    ).outerjoin(
+        Vote, and_(Vote.message_id == Message.id, Vote.user_id == USER_ID)
+    ).where(
+        Message.file_id == FILE_ID, Message.user_id == USER_ID
+    ).order_by(Message.created_at.desc(), Message.id.desc()).limit(PAGE_SIZE + 1)
+
+
+async def sync_client(engine, reads: int):
+    for _ in range(reads):
+        with Session(engine) as db:
+            db.execute(history_page_statement()).all()
+        await asyncio.sleep(0)
+
+
+async def async_client(session_factory, reads: int):
+    repository = ChatRepository()
+    for _ in range(reads):
+        async with session_factory() as db:
+            await repository.get_history_page(db, FILE_ID, USER_ID, PAGE_SIZE)
+
+
+async def run(mode: str, url: str, clients: int, reads: int) -> Dict[str, float]:
+    if mode == "sync":
+        engine = create_engine(url)
+        make_client = lambda: sync_client(engine, reads)  # noqa: E731
+    else:
+        engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        make_client = lambda: async_client(session_factory, reads)  # noqa: E731
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(lags, stop))
+    started_at = time.perf_counter()
+    await asyncio.gather(*(make_client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    await sampler
+
+    if mode == "sync":
+        engine.dispose()
+    else:
+        await engine.dispose()
+
+    lags.sort()
+    return {
+        "reads_per_second": clients * reads / elapsed,
+        "lag_p50_ms": statistics.median(lags) * 1000,
+        "lag_p99_ms": lags[min(int(0.99 * len(lags)), len(lags) - 1)] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'benchmark.db')}"
+        seed(url, args.messages)
+        for mode in ("sync", "async"):
+            result = asyncio.run(run(mode, url, args.clients, args.reads))
+            print(
+                f"{mode:>5}: {result['reads_per_second']:8.1f} reads/s, "
+                f"loop lag p50 {result['lag_p50_ms']:6.2f}ms "
+                f"p99 {result['lag_p99_ms']:6.2f}ms max {result['lag_max_ms']:6.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Settings are read on import, so the test database is chosen before any app module loads
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='chat-tests-')}/test.db")
+# No Pinecone account in tests, any vectors are kept in a scratch directory
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+os.environ.setdefault(
+    "LOCAL_VECTOR_STORE_DIR", tempfile.mkdtemp(prefix="chat-tests-vectors-"))
+
+
+@pytest.fixture(scope="session")
+def database():
+    from app.db.migrations import run_migrations
+    from app.db.session import engine
+
+    run_migrations(engine)
+    return engine
+
+
+@pytest.fixture
+def run(database):
+    """Run a coroutine on a fresh event loop, then drop the loop's pooled connections"""
+    from app.db.session import async_engine, async_read_engine
+
+    def run_coroutine(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+                await async_read_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run_coroutine
+
+
+@pytest.fixture
+def conversation(database):
+    """(user_id, file_id) of a new user owning one processed PDF"""
+    from sqlalchemy.orm import Session
+
+    from app.models.domain import PDF, User
+
+    file_id = f"test-{uuid.uuid4().hex}"
+    with Session(database) as db:
+        user = User(email=f"{file_id}@example.com", hashed_password="-")
+        db.add(user)
+        db.flush()
+        db.add(PDF(file_id=file_id, filename="test.pdf", file_path="-",
+                   user_id=user.id, is_processed=True))
+        db.commit()
+        return user.id, file_id
@@ -0,0 +1,53 @@
+from app.services.answer_cache import AnswerCache
+
+
+def downvote_answer(cache, file_id, query):
+    key = cache.put(file_id, query, None, "answer", [])
+    cache.link_message(key, hash(query))
+    cache.record_vote(hash(query), upvotes=0, downvotes=1)
+
+
+def test_downvoted_query_is_not_cached_until_the_ttl_passes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.services.answer_cache.time.monotonic", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+
+    downvote_answer(cache, "doc", "What is it?")
+
+    assert cache.get("doc", "What is it?") is None
+    assert cache.put("doc", "what is it", None, "answer", []) is None
+    now[0] += 61
+    assert cache.put("doc", "What is it?", None, "answer", []) is not None
+    assert not cache._blocked_queries
+
+
+def test_blocked_queries_are_bounded():
+    cache = AnswerCache(max_bytes=3 * 512)
+
+    for i in range(10):
+        downvote_answer(cache, "doc", f"question {i}")
+
+    assert len(cache._blocked_queries) == cache.max_blocked_queries == 3
+    assert list(cache._blocked_queries) == [("doc", f"question {i}") for i in (7, 8, 9)]
+    assert cache.put("doc", "question 0", None, "a", []) is not None
+
+
+def test_reingesting_a_document_unblocks_its_queries():
+    cache = AnswerCache()
+    downvote_answer(cache, "doc", "q")
+
+    cache.invalidate("doc")
+
+    assert cache.put("doc", "q", None, "answer", []) is not None
+
+
+def test_memory_budget_evicts_least_recently_used_answers():
+    cache = AnswerCache(max_bytes=2 * 600)
+    first = cache.put("doc", "first", None, "a" * 50, [])
+    cache.put("doc", "second", None, "b" * 50, [])
+    cache.get("doc", "first")
+    cache.put("doc", "third", None, "c" * 50, [])
+
+    assert cache.get("doc", "second") is None
+    assert cache.get("doc", "first")["answer_key"] == first
+    assert cache.size_bytes == sum(e.size_bytes for e in cache._entries.values())
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from app.api.endpoints.chat import router, send_message
+
+
+def test_chat_and_send_share_one_handler():
+    endpoints = {route.path: route.endpoint for route in router.routes}
+
+    assert endpoints["/{file_id}/chat"] is send_message
+    assert endpoints["/{file_id}/send"] is send_message
+
+
+def test_turn_marks_an_answer_served_from_cache():
+    from starlette.requests import Request
+
+    from app.api.endpoints.chat import _render_turn
+    from app.main import app
+
+    request = Request({"type": "http", "app": app, "headers": []})
+    question = SimpleNamespace(id=1, role="user", content="q", sources=None)
+    answer = SimpleNamespace(id=2, role="assistant", content="a", sources=None,
+                             upvotes=0, downvotes=0, user_vote=None)
+
+    def render(cached):
+        turn = {"messages": [question, answer], "next_cursor": None,
+                "response": {"response": "a", "cached": cached}}
+        return _render_turn(request, "f", turn)
+
+    cached, generated = render(True), render(False)
+    assert cached.headers["X-Answer-Cached"] == "true"
+    assert b"Answered from cache" in cached.body
+    assert generated.headers["X-Answer-Cached"] == "false"
+    assert b"Answered from cache" not in generated.body
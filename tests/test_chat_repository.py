@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.repositories.chat_repository import (ChatRepository, decode_cursor,
+                                             encode_cursor)
+
+
+def test_cursor_round_trip():
+    message = SimpleNamespace(created_at=datetime(2024, 5, 17, 9, 30, 1, 250), id=42)
+
+    assert decode_cursor(encode_cursor(message)) == (message.created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8tc2VwYXJhdG9y", "eHx5"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def save_pair(run, user_id, file_id, sources=None):
+    from app.db.utils import get_async_db_session
+
+    async def save():
+        async with get_async_db_session() as db:
+            return await ChatRepository().save_message_pair(
+                db, user_id, file_id, "question?", "answer.", sources)
+
+    return run(save())
+
+
+def vote(run, user_id, file_id, message_id, vote_type):
+    from app.db.utils import get_async_db_session
+
+    async def cast():
+        async with get_async_db_session() as db:
+            return await ChatRepository().apply_vote(db, user_id, file_id, message_id, vote_type)
+
+    return run(cast())
+
+
+def history(run, user_id, file_id):
+    from app.db.utils import get_async_read_db_session
+
+    async def load():
+        async with get_async_read_db_session() as db:
+            return await ChatRepository().get_history_page(db, file_id, user_id, 10)
+
+    return run(load())
+
+
+def test_save_message_pair_stores_question_then_answer(run, conversation):
+    user_id, file_id = conversation
+    sources = [{"page_number": 1}]
+
+    question, answer = save_pair(run, user_id, file_id, sources)
+
+    assert (question.role, answer.role) == ("user", "assistant")
+    assert question.id < answer.id
+    messages, next_cursor = history(run, user_id, file_id)
+    assert [(m.id, m.content, m.sources) for m in messages] == [
+        (question.id, "question?", None), (answer.id, "answer.", sources)]
+    assert next_cursor is None
+
+
+def test_votes_switch_withdraw_and_never_go_negative(run, conversation, database):
+    from sqlalchemy import update
+    from sqlalchemy.orm import Session
+
+    from app.models.domain import Message
+
+    user_id, file_id = conversation
+    question, answer = save_pair(run, user_id, file_id)
+
+    assert vote(run, user_id, file_id, answer.id, "upvote") == (1, 0, "upvote")
+    assert vote(run, user_id, file_id, answer.id, "downvote") == (0, 1, "downvote")
+    # Counters drifted below the recorded vote, withdrawing it clamps at zero
+    with Session(database) as db:
+        db.execute(update(Message).where(Message.id == answer.id).values(downvotes=0))
+        db.commit()
+    assert vote(run, user_id, file_id, answer.id, "downvote") == (0, 0, None)
+    # Questions are not votable, and nothing is recorded for them
+    assert vote(run, user_id, file_id, question.id, "upvote") is None
+    assert history(run, user_id, file_id)[0][0].user_vote is None
+
+
+def test_concurrent_votes_keep_counters_matching_recorded_votes(run, conversation, database):
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import Session
+
+    from app.db.utils import get_async_db_session
+    from app.models.domain import Message, User, Vote
+
+    user_id, file_id = conversation
+    _, answer = save_pair(run, user_id, file_id)
+    with Session(database) as db:
+        voters = [User(email=f"{file_id}-{i}@example.com", hashed_password="-")
+                  for i in range(3)]
+        db.add_all(voters)
+        db.commit()
+        voter_ids = [user_id] + [voter.id for voter in voters]
+
+    async def cast(voter_id, vote_type):
+        async with get_async_db_session() as db:
+            return await ChatRepository().apply_vote(db, voter_id, file_id, answer.id, vote_type)
+
+    async def cast_all():
+        # Every voter casts, switches and withdraws, interleaved with the others
+        await asyncio.gather(*(
+            cast(voter_id, vote_type)
+            for vote_type in ("upvote", "downvote", "downvote", "upvote")
+            for voter_id in voter_ids
+        ))
+
+    run(cast_all())
+
+    with Session(database) as db:
+        message = db.get(Message, answer.id)
+        recorded = dict(db.execute(
+            select(Vote.vote_type, func.count())
+            .where(Vote.message_id == answer.id)
+            .group_by(Vote.vote_type)
+        ).all())
+    assert (message.upvotes, message.downvotes) == (
+        recorded.get("upvote", 0), recorded.get("downvote", 0))
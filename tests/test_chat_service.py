@@ -0,0 +1,100 @@
+import asyncio
+
+from app.services.chat_service import ChatService
+
+
+class FakeEmbeddings:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    async def get_embeddings(self, texts):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return [[1.0, 0.0] for _ in texts]
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.searches = 0
+
+    async def similarity_search(self, **kwargs):
+        self.searches += 1
+        return [{
+            "processed_text": "The answer is 42.",
+            "metadata": {"page_number": 1, "file_path": "-", "score": 0.9},
+        }]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.generations = 0
+
+    async def generate_response(self, query, results, user_id=None):
+        self.generations += 1
+        return "42"
+
+    def is_degraded_response(self, response):
+        return False
+
+
+def make_service(embeddings=None):
+    return ChatService(
+        embeddings or FakeEmbeddings(), FakeVectorStore(), FakeLLM(), history_page_size=10)
+
+
+def test_answer_turn_without_access_only_embeds(run, conversation):
+    user_id, _ = conversation
+    embeddings = FakeEmbeddings(delay=1.0)
+    service = make_service(embeddings)
+
+    assert run(service.answer_turn("what?", "not-my-file", user_id)) is None
+    assert service.vector_store.searches == 0
+    assert service.llm.generations == 0
+    assert embeddings.cancelled
+
+
+def test_answer_turn_stores_question_and_answer(run, conversation):
+    user_id, file_id = conversation
+    service = make_service()
+
+    turn = run(service.answer_turn("what?", file_id, user_id))
+
+    assert turn["response"]["response"] == "42"
+    assert [(m.role, m.content) for m in turn["messages"]] == [
+        ("user", "what?"), ("assistant", "42")]
+    assert service.vector_store.searches == 1
+    assert service.embeddings.calls == 1
+
+
+def test_cancelled_turn_still_stores_its_generated_answer(run, conversation):
+    from app.db.utils import get_async_read_db_session
+
+    user_id, file_id = conversation
+    service = make_service()
+    saving = asyncio.Event()
+    save_message_pair = service.chat_repository.save_message_pair
+
+    async def slow_save_message_pair(*args, **kwargs):
+        saving.set()
+        await asyncio.sleep(0.05)
+        return await save_message_pair(*args, **kwargs)
+
+    service.chat_repository.save_message_pair = slow_save_message_pair
+
+    async def cancel_while_saving():
+        turn = asyncio.create_task(service.answer_turn("what?", file_id, user_id))
+        await saving.wait()
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        async with get_async_read_db_session() as db:
+            messages, _ = await service.get_history_page(file_id, user_id, db)
+        return turn.cancelled(), [(m.role, m.content) for m in messages]
+
+    assert run(cancel_while_saving()) == (True, [("user", "what?"), ("assistant", "42")])
@@ -0,0 +1,27 @@
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+
+
+def settings(**values):
+    return Settings(_env_file=None, SECRET_KEY="x", **values)
+
+
+def test_pinecone_backend_requires_its_settings():
+    with pytest.raises(ValidationError, match="PINECONE_API_KEY, PINECONE_INDEX_NAME"):
+        settings(VECTOR_STORE_BACKEND="pinecone", PINECONE_ENVIRONMENT="env")
+
+    configured = settings(
+        VECTOR_STORE_BACKEND="pinecone", PINECONE_API_KEY="key",
+        PINECONE_ENVIRONMENT="env", PINECONE_INDEX_NAME="index")
+    assert configured.PINECONE_INDEX_NAME == "index"
+
+
+def test_local_backend_needs_no_pinecone_settings():
+    assert settings(VECTOR_STORE_BACKEND="local").PINECONE_API_KEY is None
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValidationError, match="Unknown VECTOR_STORE_BACKEND"):
+        settings(VECTOR_STORE_BACKEND="faiss")
@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core.deadline import (
+    DeadlineExceeded,
+    current_deadline,
+    deadline_scope,
+    hedged,
+    stage_timeout,
+    stop_when_out_of_budget,
+    within_deadline,
+)
+from app.services.rag_pipeline.llm import OllamaLLM
+
+
+def test_inner_scope_cannot_extend_the_outer_deadline():
+    with deadline_scope(1) as outer:
+        with deadline_scope(60) as inner:
+            assert inner is outer
+        with deadline_scope(0.5) as shorter:
+            assert shorter is not outer
+            assert current_deadline() is shorter
+        assert current_deadline() is outer
+    assert current_deadline() is None
+
+
+def test_stage_timeout_is_capped_by_the_deadline():
+    assert stage_timeout(5) == 5
+    assert stage_timeout() is None
+    with deadline_scope(1):
+        assert stage_timeout(5) <= 1
+        assert stage_timeout(0.1) == 0.1
+
+
+def test_within_deadline_raises_once_the_budget_runs_out():
+    async def scenario():
+        with deadline_scope(0.01):
+            assert await within_deadline(asyncio.sleep(0, "done"), "fast") == "done"
+            with pytest.raises(DeadlineExceeded, match="during slow"):
+                await within_deadline(asyncio.sleep(1), "slow")
+            with pytest.raises(DeadlineExceeded, match="before next"):
+                await within_deadline(asyncio.sleep(0), "next")
+
+    asyncio.run(scenario())
+
+
+def test_stage_not_started_before_the_deadline_is_closed():
+    async def scenario():
+        stage = asyncio.sleep(0)
+        with deadline_scope(0.001):
+            await asyncio.sleep(0.01)
+            with pytest.raises(DeadlineExceeded):
+                await within_deadline(stage, "late")
+        return inspect.getcoroutinestate(stage)
+
+    assert asyncio.run(scenario()) == inspect.CORO_CLOSED
+
+
+def test_retries_stop_when_no_attempt_fits_in_the_budget():
+    stop = stop_when_out_of_budget(0.5)
+    assert not stop(SimpleNamespace(upcoming_sleep=100))
+    with deadline_scope(2):
+        assert not stop(SimpleNamespace(upcoming_sleep=1))
+        assert stop(SimpleNamespace(upcoming_sleep=1.8))
+
+
+def call(result, delay, calls, name):
+    async def run():
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return run
+
+
+def test_fast_primary_sends_no_hedge():
+    calls = []
+    result = asyncio.run(hedged(
+        call("primary", 0, calls, "primary"), call("hedge", 0, calls, "hedge"), 0.1))
+    assert result == "primary"
+    assert calls == ["primary"]
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    async def scenario():
+        calls = []
+        cancelled = asyncio.Event()
+
+        async def slow_primary():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        result = await hedged(slow_primary, call("hedge", 0, calls, "hedge"), 0.01)
+        return result, calls, cancelled.is_set()
+
+    assert asyncio.run(scenario()) == ("hedge", ["hedge"], True)
+
+
+def test_failed_hedge_falls_back_to_the_primary():
+    calls = []
+    result = asyncio.run(hedged(
+        call("primary", 0.05, calls, "primary"),
+        call(RuntimeError("hedge"), 0, calls, "hedge"),
+        0.01,
+    ))
+    assert result == "primary"
+
+
+def test_both_failing_raises():
+    calls = []
+    with pytest.raises(RuntimeError):
+        asyncio.run(hedged(
+            call(RuntimeError("primary"), 0.02, calls, "primary"),
+            call(RuntimeError("hedge"), 0, calls, "hedge"),
+            0.01,
+        ))
+    assert calls == ["primary", "hedge"]
+
+
+def test_stream_stops_at_the_deadline_while_tokens_keep_coming(monkeypatch):
+    async def ndjson():
+        for _ in range(100):
+            yield b'{"response": "token "}\n'
+            await asyncio.sleep(0.01)
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=ndjson()))
+    client = httpx.AsyncClient
+    monkeypatch.setattr(
+        "app.services.rag_pipeline.llm.httpx.AsyncClient",
+        lambda **kwargs: client(transport=transport, **kwargs),
+    )
+    llm = OllamaLLM("http://ollama", "model")
+
+    async def scenario():
+        tokens = []
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                async for token in llm.stream_response("q", []):
+                    tokens.append(token)
+        return tokens
+
+    tokens = asyncio.run(scenario())
+    assert 0 < len(tokens) < 100
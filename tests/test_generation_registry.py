@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.core.generation_registry import GenerationCancelled, GenerationRegistry
+
+
+async def answer(delay, value="answer"):
+    await asyncio.sleep(delay)
+    return value
+
+
+def test_newer_query_supersedes_the_running_one(run):
+    registry = GenerationRegistry(disconnect_poll_interval=0.01)
+
+    async def two_queries():
+        first = asyncio.ensure_future(registry.run(1, answer(1.0)))
+        await asyncio.sleep(0.05)
+        second = await registry.run(1, answer(0.0, "newer"))
+        return await asyncio.gather(first, return_exceptions=True), second
+
+    (first,), second = run(two_queries())
+    assert isinstance(first, GenerationCancelled)
+    assert first.reason == "superseded by a newer query"
+    assert second == "newer"
+
+
+def test_disconnected_client_cancels_the_generation(run):
+    registry = GenerationRegistry(disconnect_poll_interval=0.01)
+
+    async def disconnected():
+        return True
+
+    with pytest.raises(GenerationCancelled, match="client disconnected"):
+        run(registry.run(1, answer(1.0), disconnected))
+
+
+def test_query_in_another_worker_supersedes_a_shared_generation(run, conversation):
+    user_id, _ = conversation
+    # Two registries stand for two worker processes sharing the database
+    worker_a = GenerationRegistry(disconnect_poll_interval=0.01, shared=True)
+    worker_b = GenerationRegistry(disconnect_poll_interval=0.01, shared=True)
+
+    async def stream(registry, delay):
+        async def events():
+            for token in ("a", "b", "c"):
+                await asyncio.sleep(delay)
+                yield token
+        return [event async for event in registry.stream(user_id, events())]
+
+    async def two_workers():
+        first = asyncio.ensure_future(stream(worker_a, 0.5))
+        await asyncio.sleep(0.05)
+        second = await worker_b.run(user_id, answer(0.1, "newer"))
+        return await asyncio.gather(first, return_exceptions=True), second
+
+    (first,), second = run(two_workers())
+    assert isinstance(first, GenerationCancelled)
+    assert second == "newer"
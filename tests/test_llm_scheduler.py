@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services.rag_pipeline.llm_scheduler import LLMScheduler, QueueTimeout
+
+
+def test_freed_slots_go_round_robin_across_users():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrent=1)
+        order = []
+
+        async def generate(user, name, ready=None):
+            async with scheduler.slot(user):
+                order.append(name)
+                if ready is not None:
+                    await ready.wait()
+                await asyncio.sleep(0)
+
+        release = asyncio.Event()
+        first = asyncio.create_task(generate("a", "a1", release))
+        await asyncio.sleep(0)
+        # "a" queues three more questions before "b" asks one
+        waiting = [asyncio.create_task(generate("a", f"a{i}")) for i in (2, 3, 4)]
+        await asyncio.sleep(0)
+        waiting.append(asyncio.create_task(generate("b", "b1")))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 4
+
+        release.set()
+        await asyncio.gather(first, *waiting)
+        return order, scheduler
+
+    order, scheduler = asyncio.run(scenario())
+    assert order == ["a1", "a2", "b1", "a3", "a4"]
+    assert scheduler.queue_depth == 0
+    assert scheduler._active == 0
+
+
+def test_waiting_too_long_is_refused_and_frees_its_place():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrent=1, max_queue_wait=0.01)
+        async with scheduler.slot("a"):
+            with pytest.raises(QueueTimeout):
+                async with scheduler.slot("b"):
+                    pass
+            assert scheduler.queue_depth == 0
+        async with scheduler.slot("b"):
+            return scheduler._active
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrent=1)
+        async with scheduler.slot("a"):
+            waiter = asyncio.create_task(scheduler._acquire("b"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler._active == 0
+    assert scheduler.queue_depth == 0
@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.rag_pipeline.local_vector_store import LocalVectorStore
+
+
+def vectors(file_id, embeddings):
+    return [
+        {"id": f"{file_id}-{i}", "values": values,
+         "metadata": {"text": f"chunk {i}", "file_id": file_id}}
+        for i, values in enumerate(embeddings)
+    ]
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).normal(size=(50, 16)).tolist()
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_round_trip_survives_reopening(tmp_path, embeddings, dtype):
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    asyncio.run(store._upsert_vectors(vectors("doc", embeddings)))
+
+    # A new instance reads everything back from disk
+    reopened = LocalVectorStore(str(tmp_path), dtype=dtype)
+    matches = asyncio.run(reopened._query_vectors(embeddings[7], 3, {"file_id": "doc"}))
+
+    assert matches[0].id == "doc-7"
+    assert matches[0].score == pytest.approx(1.0, abs=1e-5)
+    assert matches[0].metadata == {"text": "chunk 7", "file_id": "doc"}
+    expected = np.asarray(embeddings[7]) / np.linalg.norm(embeddings[7])
+    assert np.allclose(matches[0].values, expected, atol=1e-6)
+    assert [m.score for m in matches] == sorted((m.score for m in matches), reverse=True)
+
+
+def test_delete_document_leaves_other_documents(tmp_path, embeddings):
+    store = LocalVectorStore(str(tmp_path))
+    asyncio.run(store._upsert_vectors(vectors("a", embeddings[:10]) + vectors("b", embeddings[10:20])))
+
+    asyncio.run(store.delete_document("a"))
+    asyncio.run(store._upsert_vectors(vectors("a", embeddings[:2])))
+
+    matches = asyncio.run(store._query_vectors(embeddings[0], 5, {"file_id": "a"}))
+    assert [m.id for m in matches] == ["a-0", "a-1"]
+    assert set(asyncio.run(store._fetch_values(["a-0", "a-5"], "a"))) == {"a-0"}
+    assert set(asyncio.run(store._fetch_values(["b-5"], "b"))) == {"b-5"}
+
+
+def test_upserting_a_stored_id_replaces_its_row(tmp_path, embeddings):
+    store = LocalVectorStore(str(tmp_path))
+    asyncio.run(store._upsert_vectors(vectors("doc", embeddings[:5])))
+    replacement = vectors("doc", embeddings[10:11])
+    replacement[0]["metadata"]["text"] = "new text"
+    asyncio.run(store._upsert_vectors(replacement))
+
+    reopened = LocalVectorStore(str(tmp_path))
+    matches = asyncio.run(reopened._query_vectors(embeddings[10], 10, {"file_id": "doc"}))
+    assert sorted(m.id for m in matches) == [f"doc-{i}" for i in range(5)]
+    assert matches[0].id == "doc-0"
+    assert matches[0].metadata["text"] == "new text"
+    assert all(m.metadata["text"] == f"chunk {m.id[-1]}" for m in matches[1:])
+
+
+def test_interrupted_append_is_cut_back_on_load(tmp_path, embeddings):
+    store = LocalVectorStore(str(tmp_path))
+    asyncio.run(store._upsert_vectors(vectors("doc", embeddings[:5])))
+    # Vectors of a second batch reached disk, its records did not
+    with open(tmp_path / "doc" / "full.bin", "ab") as f:
+        f.write(np.zeros((3, 16), dtype=np.float32).tobytes())
+    with open(tmp_path / "doc" / "chunks.jsonl", "ab") as f:
+        f.write(b'{"id": "doc-5", "meta')
+
+    reopened = LocalVectorStore(str(tmp_path))
+    asyncio.run(reopened._upsert_vectors(vectors("doc", embeddings[:7])[5:]))
+
+    matches = asyncio.run(reopened._query_vectors(embeddings[6], 10, {"file_id": "doc"}))
+    assert matches[0].id == "doc-6"
+    assert matches[0].metadata["text"] == "chunk 6"
+    assert len(matches) == 7
+
+
+def test_open_documents_are_bounded(tmp_path, embeddings):
+    store = LocalVectorStore(str(tmp_path), max_open_documents=2)
+    for file_id in "abc":
+        asyncio.run(store._upsert_vectors(vectors(file_id, embeddings[:3])))
+
+    assert list(store._documents) == ["b", "c"]
+    matches = asyncio.run(store._query_vectors(embeddings[1], 1, {"file_id": "a"}))
+    assert matches[0].id == "a-1"
+
+
+def test_rescore_factor_below_one_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        LocalVectorStore(str(tmp_path), rescore_factor=0)
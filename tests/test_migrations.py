@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from app.db.migrations import MIGRATIONS, run_migrations
+from app.db.session import create_db_engine
+
+
+def test_concurrent_workers_apply_each_migration_once(tmp_path):
+    url = f"sqlite:///{tmp_path}/workers.db"
+    engines = [create_db_engine(url, "sync", 1) for _ in range(4)]
+
+    with ThreadPoolExecutor(len(engines)) as pool:
+        results = list(pool.map(run_migrations, engines))
+
+    applied = sorted(migration for result in results for migration in result)
+    assert applied == sorted(migration_id for migration_id, _ in MIGRATIONS)
+    with engines[0].connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM schema_migrations")).scalar() == len(MIGRATIONS)
+    for engine in engines:
+        engine.dispose()
+
+
+def test_migrations_are_not_applied_twice(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/again.db", "sync", 1)
+
+    assert run_migrations(engine)
+    assert run_migrations(engine) == []
+    engine.dispose()
@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.deadline import deadline_scope
+from app.services.rag_pipeline.llm import OllamaLLM
+from app.services.rag_pipeline.ollama_pool import OllamaHostPool
+
+
+def fail(pool, error):
+    async def request():
+        async with pool.request():
+            raise error
+
+    with pytest.raises(type(error)):
+        asyncio.run(request())
+
+
+def failures(pool):
+    return [host["consecutive_failures"] for host in pool.snapshot()]
+
+
+def test_host_is_ejected_after_consecutive_failures():
+    pool = OllamaHostPool(["http://a", "http://b"], "test-eject", failure_threshold=2)
+
+    fail(pool, httpx.ConnectError("refused"))
+    fail(pool, httpx.ConnectError("refused"))
+
+    assert failures(pool) == [2, 0]
+    assert pool.pick() == "http://b"
+    # With every other host excluded, an ejected host is still used
+    assert pool.pick(exclude=["http://b"]) == "http://a"
+
+
+def test_timeout_after_the_deadline_is_not_a_host_failure():
+    pool = OllamaHostPool(["http://a"], "test-deadline", failure_threshold=1)
+
+    async def timed_out_request():
+        with deadline_scope(0.01):
+            await asyncio.sleep(0.02)
+            async with pool.request():
+                raise httpx.ReadTimeout("read timed out")
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(timed_out_request())
+    assert failures(pool) == [0]
+
+    # Without a deadline the host itself was too slow
+    fail(pool, httpx.ReadTimeout("read timed out"))
+    assert failures(pool) == [1]
+
+
+def test_client_errors_are_not_host_failures():
+    pool = OllamaHostPool(["http://a"], "test-client-error")
+    request = httpx.Request("POST", "http://a/api/generate")
+    error = httpx.HTTPStatusError(
+        "not found", request=request, response=httpx.Response(404, request=request))
+
+    fail(pool, error)
+
+    assert failures(pool) == [0]
+
+
+def test_slow_generation_is_hedged_on_another_host_of_the_pool():
+    pool = OllamaHostPool(["http://a", "http://b"], "test-hedge")
+    llm = OllamaLLM("http://a", "model", hedge_delay=0.01, host_pool=pool)
+    seen = []
+
+    async def post_generate(base_url, prompt):
+        seen.append(base_url)
+        if len(seen) == 1:
+            await asyncio.sleep(10)
+        return {"response": base_url}
+
+    llm._post_generate = post_generate
+    result = asyncio.run(llm._make_llm_request("prompt"))
+
+    assert len(seen) == 2 and seen[0] != seen[1]
+    assert result == {"response": seen[1]}
+    assert [host["outstanding"] for host in pool.snapshot()] == [0, 0]
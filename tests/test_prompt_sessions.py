@@ -0,0 +1,41 @@
+from app.services.rag_pipeline.context_packer import ContextPacker
+from app.services.rag_pipeline.prompt_sessions import PromptSessions
+
+
+def chunk(page, score, text=None):
+    return {"text": text or f"Text of page {page}.", "metadata": {"page_number": page, "score": score}}
+
+
+def pages(chunks):
+    return [doc["metadata"]["page_number"] for doc in chunks]
+
+
+def test_retrieved_chunks_keep_their_place_and_new_ones_follow():
+    sessions = PromptSessions(ContextPacker())
+    sessions.arrange("conversation", [chunk(1, 0.9), chunk(2, 0.8)], 1000)
+
+    arranged = sessions.arrange("conversation", [chunk(3, 0.95), chunk(2, 0.9), chunk(1, 0.5)], 1000)
+
+    assert pages(arranged) == [1, 2, 3]
+
+
+def test_pinned_chunks_not_retrieved_again_are_dropped():
+    sessions = PromptSessions(ContextPacker())
+    sessions.arrange("conversation", [chunk(1, 0.9), chunk(2, 0.8), chunk(3, 0.7)], 1000)
+
+    # Page 2 is no longer relevant; page 3 after it cannot reuse the prefix
+    arranged = sessions.arrange("conversation", [chunk(3, 0.9), chunk(1, 0.8), chunk(4, 0.7)], 1000)
+
+    assert pages(arranged) == [1, 3, 4]
+
+
+def test_trimmed_pinned_chunk_is_not_sent_twice():
+    packer = ContextPacker(chars_per_token=1, min_trim_tokens=10)
+    sessions = PromptSessions(packer)
+    long_text = "First sentence here. " * 10
+    first = sessions.arrange("conversation", [chunk(1, 0.9), chunk(2, 0.8, long_text)], 80)
+    assert first[1]["text"] != long_text
+
+    arranged = sessions.arrange("conversation", [chunk(2, 0.9, long_text), chunk(1, 0.8)], 80)
+
+    assert pages(arranged) == [1, 2]
@@ -0,0 +1,12 @@
+from app.db.query_plans import HOT_CALLS, explain_hot_calls, find_table_scans
+
+
+def test_every_hot_call_is_explained():
+    plans = explain_hot_calls()
+
+    assert set(plans) == set(HOT_CALLS)
+    assert all(plans[name] for name in HOT_CALLS)
+
+
+def test_hot_calls_never_scan_a_table():
+    assert find_table_scans() == {}
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app.services.rag_pipeline.keyword_index import reciprocal_rank_fusion
+from app.services.rag_pipeline.reranker import mmr_rerank
+from app.services.rag_pipeline.vector_store import VectorMatch, VectorStore
+
+
+class FakeKeywordIndex:
+    def __init__(self, hits):
+        self.hits = hits
+
+    async def search(self, query, processed_query, file_id, limit=10):
+        return self.hits[:limit]
+
+
+class MemoryStore(VectorStore):
+    """Vector store over a dict of id -> (values, score), no storage backend"""
+
+    def __init__(self, vectors, keyword_hits=(), **options):
+        super().__init__(keyword_index=FakeKeywordIndex(list(keyword_hits)), **options)
+        self.vectors = vectors
+        # No NLTK corpora needed to test the fusion
+        self.text_processor.preprocess_text = str.lower
+
+    async def _query_vectors(self, query_embedding, top_k, metadata_filter):
+        ranked = sorted(self.vectors.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            VectorMatch(id=chunk_id, score=score, values=values,
+                        metadata=metadata(chunk_id))
+            for chunk_id, (values, score) in ranked[:top_k]
+        ]
+
+    async def _fetch_values(self, ids, file_id):
+        return {chunk_id: self.vectors[chunk_id][0] for chunk_id in ids if chunk_id in self.vectors}
+
+    async def _upsert_vectors(self, vectors):
+        raise NotImplementedError
+
+    async def _delete_vectors(self, file_id):
+        raise NotImplementedError
+
+
+def metadata(chunk_id):
+    return {"text": chunk_id, "processed_text": chunk_id, "file_path": "-",
+            "page_number": 1, "file_id": "doc"}
+
+
+def keyword_hit(chunk_id, bm25_score):
+    return {"chunk_id": chunk_id, "bm25_score": bm25_score, **metadata(chunk_id)}
+
+
+def search(store, **options):
+    return asyncio.run(store.similarity_search(
+        [1.0, 0.0], top_k=5, metadata_filter={"file_id": "doc"}, query_text="q", **options))
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert max(fused, key=fused.get) == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_hybrid_search_cuts_on_real_scores_and_orders_by_fusion():
+    store = MemoryStore(
+        {
+            "close": ([1.0, 0.0], 0.9),
+            "near": ([0.9, 0.1], 0.8),
+            "far": ([0.0, 1.0], 0.1),
+            "keyword-only": ([0.0, 1.0], 0.0),
+        },
+        keyword_hits=[keyword_hit("near", 10.0), keyword_hit("keyword-only", 9.0),
+                      keyword_hit("weak", 1.0)],
+    )
+
+    results = search(store)
+
+    # "far" fails both cutoffs, "weak" has a poor BM25 score and no vector
+    assert [r["text"] for r in results] == ["near", "keyword-only", "close"]
+    scores = [r["metadata"]["score"] for r in results]
+    # Scores stay cosine similarities, including the keyword-only hit's
+    assert scores == [0.8, pytest.approx(0.0), 0.9]
+    assert all("keyword_score" not in r and "id" not in r for r in results)
+
+
+def test_hybrid_search_without_vector_matches_keeps_best_keyword_hits():
+    store = MemoryStore({}, keyword_hits=[keyword_hit("a", 5.0), keyword_hit("b", 1.0)])
+
+    assert [r["text"] for r in search(store)] == ["a"]
+
+
+def test_mmr_prefers_diverse_candidates():
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+
+    assert mmr_rerank(query, candidates, top_k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_rerank(query, candidates, top_k=2, lambda_mult=0.3) == [0, 2]
+    assert mmr_rerank(query, [], top_k=2) == []
+
+
+def test_close_shuts_down_the_text_processing_workers():
+    store = MemoryStore({}, text_processing_workers=1)
+    store.close()  # Nothing started yet
+    executor = store._text_executor = ProcessPoolExecutor(max_workers=1)
+
+    store.close()
+
+    assert store._text_executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(str.lower, "x")
+
+
+def test_backend_missing_a_storage_primitive_cannot_be_created():
+    class NoDelete(VectorStore):
+        async def _upsert_vectors(self, vectors): ...
+        async def _query_vectors(self, query_embedding, top_k, metadata_filter): ...
+        async def _fetch_values(self, ids, file_id): ...
+
+    with pytest.raises(TypeError, match="_delete_vectors"):
+        NoDelete()
@@ -0,0 +1,55 @@
+from app.services.query_cache import normalize_query
+from app.services.retrieval_cache import RetrievalCache
+
+
+def results(text):
+    return [{"text": text, "metadata": {"page_number": 1}}]
+
+
+def test_normalized_query_hits_and_results_are_copies():
+    cache = RetrievalCache()
+    cache.put("doc", "What is it?", None, results("a"))
+
+    hit = cache.get("doc", "  what IS it ")
+    hit[0]["text"] = "changed"
+
+    assert normalize_query("What, is it?") == "what is it"
+    assert cache.get("doc", "what is it")[0]["text"] == "a"
+    assert cache.hits == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RetrievalCache(max_entries=2)
+    cache.put("doc", "a", None, results("a"))
+    cache.put("doc", "b", None, results("b"))
+    cache.get("doc", "a")
+    cache.put("doc", "c", None, results("c"))
+
+    assert cache.get("doc", "b") is None
+    assert cache.get("doc", "a") is not None
+    assert cache.get("doc", "c") is not None
+
+
+def test_similar_lookup_stays_within_the_document(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.services.query_cache.time.monotonic", lambda: now[0])
+    cache = RetrievalCache(ttl_seconds=10, similarity_threshold=0.9)
+    cache.put("doc", "a", [1.0, 0.0], results("a"))
+
+    assert cache.get_similar("doc", [0.99, 0.1])[0]["text"] == "a"
+    assert cache.get_similar("other", [1.0, 0.0]) is None
+    assert cache.get_similar("doc", [0.0, 1.0]) is None
+    now[0] = 11
+    assert cache.get_similar("doc", [1.0, 0.0]) is None
+    assert not cache._keys_by_file
+
+
+def test_invalidate_drops_only_that_document():
+    cache = RetrievalCache()
+    cache.put("doc", "a", None, results("a"))
+    cache.put("other", "a", None, results("a"))
+
+    cache.invalidate("doc")
+
+    assert cache.get("doc", "a") is None
+    assert cache.get("other", "a") is not None